@@ -0,0 +1,76 @@
+"""resize embedding columns to the configured model
+
+Revision ID: c41f7d2a9b85
+Revises: a2e302ccf199, e382e4ca5166
+Create Date: 2026-10-19 10:12:41.518903
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from rag.agentic_rag.embedding_service import embedding_dim
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7d2a9b85'
+down_revision: Union[str, Sequence[str], None] = ('a2e302ccf199', 'e382e4ca5166')
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# data_li_document is created by LlamaIndex's PGVectorStore, not by a migration.
+TABLES = ("document", "li_document", "data_li_document")
+# pgvector indexes vectors of up to 2000 dimensions.
+MAX_INDEXED_DIM = 2000
+
+
+def _column_dim(conn, table: str):
+    # For pgvector columns the type modifier is the dimension.
+    return conn.execute(sa.text(
+        "SELECT atttypmod FROM pg_attribute "
+        "WHERE attrelid = to_regclass(:table) AND attname = 'embedding' AND NOT attisdropped"
+    ), {"table": f"public.{table}"}).scalar()
+
+
+def upgrade() -> None:
+    """
+    Alter the embedding columns to EMBEDDING_DIM / the EMBEDDING_MODEL's size.
+
+    Vectors of another size cannot be converted, so tables that hold rows
+    are only emptied with EMBEDDING_RESIZE_DISCARD=1; the documents then
+    have to be ingested again. Vector indexes are dropped and recreated.
+    """
+    conn = op.get_bind()
+    dim = embedding_dim()
+    for table in TABLES:
+        current = _column_dim(conn, table)
+        if current is None or current == dim:
+            continue
+        rows = conn.execute(sa.text(f"SELECT count(*) FROM public.{table}")).scalar()
+        if rows:
+            if os.getenv("EMBEDDING_RESIZE_DISCARD") != "1":
+                raise RuntimeError(
+                    f"public.{table} holds {rows} embeddings of dimension {current}, the configured model "
+                    f"uses {dim}. Set EMBEDDING_RESIZE_DISCARD=1 to empty it and re-ingest the documents."
+                )
+            op.execute(f"TRUNCATE public.{table}")
+
+        indexes = conn.execute(sa.text(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = 'public' AND tablename = :table AND indexdef ~ '(ivfflat|hnsw)'"
+        ), {"table": table}).fetchall()
+        for name, _ in indexes:
+            op.execute(f"DROP INDEX IF EXISTS public.{name}")
+        op.execute(f"ALTER TABLE public.{table} ALTER COLUMN embedding TYPE vector({dim})")
+        if dim <= MAX_INDEXED_DIM:
+            for _, definition in indexes:
+                op.execute(definition)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # No-op, so that after switching models `alembic downgrade -1 && alembic upgrade heads`
+    # runs the resize again for the new dimension.
+    pass
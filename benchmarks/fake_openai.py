@@ -0,0 +1,230 @@
+"""
+Deterministic stand-in for the OpenAI HTTP API.
+
+Serves `/v1/embeddings`, `/v1/chat/completions` (plain, streamed and
+function/tool calling) and `/v1/completions` with configurable latency,
+so the services can be load-tested without network noise or API cost.
+Point the clients at it with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_BASE=http://127.0.0.1:8900/v1
+
+Run standalone:
+
+    python -m benchmarks.fake_openai --port 8900 --chat-latency-ms 300
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBED_DIM = 1536
+WORD_RE = re.compile(r"[A-Za-z0-9]+")
+DOC_MARKER_RE = re.compile(r"Document (\d+):")
+
+
+class FakeOpenAIConfig:
+    def __init__(self, embedding_latency_ms: float = 20.0, chat_latency_ms: float = 300.0,
+                 token_delay_ms: float = 10.0, jitter: float = 0.1, embed_dim: int = EMBED_DIM, seed: int = 0):
+        self.embedding_latency_ms = embedding_latency_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.token_delay_ms = token_delay_ms
+        self.jitter = jitter
+        self.embed_dim = embed_dim
+        self.rng = random.Random(seed)
+
+    async def sleep(self, base_ms: float) -> None:
+        if base_ms <= 0:
+            return
+        spread = base_ms * self.jitter
+        await asyncio.sleep(max(0.0, base_ms + self.rng.uniform(-spread, spread)) / 1000.0)
+
+
+def embed(text: str, dim: int = EMBED_DIM) -> List[float]:
+    """
+    Feature-hashed bag of words, L2 normalised. Deterministic, and texts
+    sharing words get similar vectors, so retrieval stays meaningful.
+    """
+    vec = [0.0] * dim
+    for word in WORD_RE.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vec[bucket] += sign
+    norm = math.sqrt(sum(v * v for v in vec))
+    if norm == 0.0:
+        vec[0] = 1.0
+        return vec
+    return [v / norm for v in vec]
+
+
+def _last_user_message(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content
+    return ""
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(m.get("content") or "") for m in messages)
+
+
+def _answer_for(prompt: str, question: str) -> str:
+    docs = DOC_MARKER_RE.findall(prompt)
+    if docs and "relevance" in prompt.lower():
+        # LLMRerank choice-select format
+        return "\n".join(f"Doc: {d}, Relevance: {10 - i}" for i, d in enumerate(docs[:5]))
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+    return f"Deterministic answer {digest} to: {question[:200]}"
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(completion) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _tool_call_message(body: Dict[str, Any], question: str) -> Optional[Dict[str, Any]]:
+    """First turn of a function-calling conversation: call the first tool (or several, see below)."""
+    messages = body.get("messages", [])
+    if any(m.get("role") in ("function", "tool") for m in messages):
+        return None
+    arguments = json.dumps({"__arg1": question, "tool_input": question})
+    if body.get("tools"):
+        name = body["tools"][0]["function"]["name"]
+        return {"role": "assistant", "content": None, "tool_calls": [
+            {"id": "call_" + hashlib.sha1(question.encode()).hexdigest()[:12], "type": "function",
+             "function": {"name": name, "arguments": arguments}},
+        ]}
+    if body.get("functions"):
+        name = body["functions"][0]["name"]
+        if name == "tool_selection":
+            # Multi-functions agent: ask for every tool offered but the last at once.
+            tools = body["functions"][0]["parameters"]["properties"]["actions"]["items"]["properties"][
+                "action_name"]["enum"]
+            actions = [{"action_name": tool, "action": {"__arg1": question}} for tool in tools[:-1] or tools]
+            arguments = json.dumps({"actions": actions})
+        return {"role": "assistant", "content": None, "function_call": {"name": name, "arguments": arguments}}
+    return None
+
+
+def create_app(config: Optional[FakeOpenAIConfig] = None) -> FastAPI:
+    config = config or FakeOpenAIConfig()
+    app = FastAPI()
+    app.state.config = config
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request) -> JSONResponse:
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await config.sleep(config.embedding_latency_ms)
+        dim = int(body.get("dimensions") or config.embed_dim)
+        data = [{"object": "embedding", "index": i, "embedding": embed(str(text), dim)}
+                for i, text in enumerate(inputs)]
+        tokens = sum(max(1, len(str(t)) // 4) for t in inputs)
+        return JSONResponse({"object": "list", "data": data, "model": body.get("model", "fake-embedding"),
+                             "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        question = _last_user_message(messages)
+        prompt = _prompt_text(messages)
+        model = body.get("model", "fake-chat")
+        created = int(time.time())
+        await config.sleep(config.chat_latency_ms)
+
+        tool_message = _tool_call_message(body, question)
+        if tool_message is not None:
+            finish_reason = "tool_calls" if "tool_calls" in tool_message else "function_call"
+            return JSONResponse({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": tool_message, "finish_reason": finish_reason}],
+                "usage": _usage(prompt, ""),
+            })
+
+        answer = _answer_for(prompt, question)
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                             "finish_reason": "stop"}],
+                "usage": _usage(prompt, answer),
+            })
+
+        async def stream():
+            for i, word in enumerate(answer.split(" ")):
+                token = word if i == 0 else " " + word
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                         "model": model, "choices": [{"index": 0, "delta": {"content": token},
+                                                      "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await config.sleep(config.token_delay_ms)
+            final = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/completions")
+    async def completions(request: Request) -> JSONResponse:
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        if isinstance(prompt, list):
+            prompt = "\n".join(prompt)
+        await config.sleep(config.chat_latency_ms)
+        answer = _answer_for(prompt, prompt.strip().splitlines()[-1] if prompt.strip() else "")
+        return JSONResponse({
+            "id": "cmpl-fake", "object": "text_completion", "created": int(time.time()),
+            "model": body.get("model", "fake-instruct"),
+            "choices": [{"index": 0, "text": answer, "finish_reason": "stop", "logprobs": None}],
+            "usage": _usage(prompt, answer),
+        })
+
+    @app.get("/v1/models")
+    async def models() -> JSONResponse:
+        return JSONResponse({"object": "list", "data": []})
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0)
+    parser.add_argument("--token-delay-ms", type=float, default=10.0)
+    parser.add_argument("--jitter", type=float, default=0.1, help="Relative latency jitter (0.1 = +/-10%%)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(
+        embedding_latency_ms=args.embedding_latency_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        token_delay_ms=args.token_delay_ms,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
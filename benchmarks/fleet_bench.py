@@ -0,0 +1,123 @@
+"""
+Throughput of the delivery simulation as the fleet grows.
+
+Runs the array-backed `Fleet` (rag/behavior_tree/fleet.py) and, for the
+smaller sizes, one py_trees tree per agent on the virtual clock, and
+reports agent-ticks per second for each fleet size. The map is the demo
+road map or, with `--grid N`, an N x N grid with a hub in the middle and
+`--closed` random roads closed in the world but not on the map.
+
+    python -m benchmarks.fleet_bench --agents 10 100 1000 10000 100000
+    python -m benchmarks.fleet_bench --grid 40 --closed 50 --steps 200 --tree-max 0
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# The simulation modules import each other by module name.
+sys.path.insert(0, str(REPO_ROOT / "rag" / "behavior_tree"))
+
+from agent_state_rag import build_road_graph  # noqa: E402
+from fleet import Fleet  # noqa: E402
+from road_graph import RoadGraph  # noqa: E402
+
+DEMO_PICKUPS = ["A", "B", "C", "D"]
+
+
+def grid_map(size: int, closed: int, seed: int) -> Tuple[RoadGraph, str, List[str], List[Tuple[str, str]]]:
+    """An N x N grid of unit roads; pickups on the border, the hub in the middle."""
+    graph = RoadGraph()
+    for x in range(size):
+        for y in range(size):
+            graph.add_node(f"{x},{y}", (x, y))
+    for x in range(size):
+        for y in range(size):
+            if x + 1 < size:
+                graph.add_edge(f"{x},{y}", f"{x + 1},{y}")
+            if y + 1 < size:
+                graph.add_edge(f"{x},{y}", f"{x},{y + 1}")
+    hub = f"{size // 2},{size // 2}"
+    pickups = [f"{x},{y}" for x in range(size) for y in range(size) if x in (0, size - 1) or y in (0, size - 1)]
+    rng = random.Random(seed)
+    edges = [(u, v) for u in graph.nodes() for v in graph.successors(u) if u < v]
+    return graph, hub, pickups, rng.sample(edges, min(closed, len(edges)))
+
+
+def make_map(args: argparse.Namespace):
+    if args.grid:
+        return grid_map(args.grid, args.closed, args.seed)
+    return build_road_graph(), "E", DEMO_PICKUPS, []
+
+
+def bench_fleet(args: argparse.Namespace, agents: int) -> Dict[str, Any]:
+    graph, hub, pickups, closed = make_map(args)
+    fleet = Fleet(graph, agents, pickups, hub=hub, seed=args.seed)
+    for u, v in closed:
+        fleet.close_road(u, v)
+    started = time.perf_counter()
+    stats = fleet.run(args.steps)
+    elapsed = time.perf_counter() - started
+    return {"mode": "fleet", "agents": agents, "seconds": elapsed,
+            "agent_ticks_per_s": agents * args.steps / elapsed, **stats}
+
+
+def bench_trees(args: argparse.Namespace, agents: int) -> Dict[str, Any]:
+    """One py_trees tree per agent on the demo map, ticked sequentially without pauses."""
+    from py_trees.blackboard import Blackboard
+
+    import construct_run_behavior_tree as demo
+    from sim_clock import VirtualClock, set_clock
+
+    set_clock(VirtualClock())
+    rng = random.Random(args.seed)
+    trees = demo.build_agents([(f"Agent{i}", rng.choice(DEMO_PICKUPS)) for i in range(agents)])
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in range(1, args.steps + 1):
+            Blackboard.set("current_time", t)
+            for agent in trees:
+                agent.tree.tick()
+    elapsed = time.perf_counter() - started
+    return {"mode": "trees", "agents": agents, "seconds": elapsed,
+            "agent_ticks_per_s": agents * args.steps / elapsed}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", nargs="+", type=int, default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--grid", type=int, default=0, help="Grid map size (default: the demo map)")
+    parser.add_argument("--closed", type=int, default=0, help="Roads closed on the grid map")
+    parser.add_argument("--tree-max", type=int, default=1000,
+                        help="Largest fleet also run as py_trees trees (demo map only)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the result rows as JSON")
+    args = parser.parse_args(argv)
+
+    rows: List[Dict[str, Any]] = []
+    for agents in args.agents:
+        if not args.grid and agents <= args.tree_max:
+            rows.append(bench_trees(args, agents))
+        rows.append(bench_fleet(args, agents))
+        print(json.dumps(rows[-1]), file=sys.stderr, flush=True)
+
+    header = f"{'mode':<7}{'agents':>9}{'seconds':>10}{'agent-ticks/s':>16}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['mode']:<7}{row['agents']:>9}{row['seconds']:>10.3f}{row['agent_ticks_per_s']:>16,.0f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Accuracy/coverage report for the embedding query router.
+
+Embeds the router exemplars and a labeled question set (by default
+`benchmarks/data/router_eval.json`; `--leave-one-out` evaluates on the
+exemplars themselves), classifies every question and reports:
+
+    accuracy      argmax route matches the label, over all questions
+    coverage      share of questions the router is confident about
+    precision     accuracy over the confident (routed) questions only
+    calls saved   agent LLM calls avoided per question, on average
+
+per `--min-score` / `--min-margin` setting, plus a confusion matrix for
+the configured thresholds.
+
+    python -m benchmarks.router_eval --embedder openai
+    python -m benchmarks.router_eval --embedder openai --min-score 0.35 0.4 0.45 0.5 --min-margin 0 0.03 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag.agentic_rag.router import EmbeddingRouter, load_exemplars
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_EVAL = REPO_ROOT / "benchmarks" / "data" / "router_eval.json"
+
+# The agent spends one LLM call choosing the tool and one writing the final
+# answer; a routed web_search still needs one synthesis call.
+AGENT_LLM_CALLS = 2
+ROUTED_LLM_CALLS = {"vector_search": 0, "sql_query": 0, "web_search": 1}
+
+
+def _embed(texts: List[str], embedder: str, dim: int) -> np.ndarray:
+    if embedder == "fake":
+        from benchmarks.fake_openai import embed
+        return np.asarray([embed(t, dim) for t in texts], dtype=np.float32)
+
+    import openai
+    vectors = []
+    for i in range(0, len(texts), 256):
+        response = openai.embeddings.create(input=texts[i:i + 256], model="text-embedding-3-small")
+        vectors.extend(d.embedding for d in response.data)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _flatten(labeled: Dict[str, List[str]]) -> Tuple[List[str], List[str]]:
+    labels = [route for route, questions in labeled.items() for _ in questions]
+    texts = [q for questions in labeled.values() for q in questions]
+    return labels, texts
+
+
+def evaluate(router: EmbeddingRouter, labels: List[str], vectors: np.ndarray,
+             skip_self: bool = False) -> Dict[str, Any]:
+    """Classify `vectors`; with `skip_self`, vector i is held out of the exemplars (leave-one-out)."""
+    decisions = []
+    latencies = []
+    for i, vector in enumerate(vectors):
+        current = router
+        if skip_self:
+            keep = np.arange(len(router.labels)) != i
+            current = EmbeddingRouter(router.labels[keep], router.vectors[keep], router.min_score,
+                                      router.min_margin, router.top_k)
+        start = time.perf_counter()
+        decisions.append(current.classify(vector))
+        latencies.append(time.perf_counter() - start)
+
+    correct = [d.route == label for d, label in zip(decisions, labels)]
+    confident = [d.confident for d in decisions]
+    routed_correct = [c for c, conf in zip(correct, confident) if conf]
+    saved = [AGENT_LLM_CALLS - ROUTED_LLM_CALLS.get(d.route, 1) if d.confident else 0 for d in decisions]
+
+    confusion: Dict[str, Dict[str, int]] = {}
+    for d, label in zip(decisions, labels):
+        predicted = d.route if d.confident else "agent"
+        confusion.setdefault(label, {}).setdefault(predicted, 0)
+        confusion[label][predicted] += 1
+
+    return {
+        "min_score": router.min_score,
+        "min_margin": router.min_margin,
+        "questions": len(labels),
+        "accuracy": round(sum(correct) / len(correct), 4),
+        "coverage": round(sum(confident) / len(confident), 4),
+        "precision": round(sum(routed_correct) / len(routed_correct), 4) if routed_correct else 0.0,
+        "calls_saved": round(sum(saved) / len(saved), 3),
+        "classify_us_p50": round(float(np.percentile(latencies, 50)) * 1e6, 1),
+        "confusion": confusion,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", choices=["fake", "openai"], default="fake")
+    parser.add_argument("--dim", type=int, default=1536, help="Fake embedder dimension")
+    parser.add_argument("--exemplars", help="Router exemplars JSON (default: the app's)")
+    parser.add_argument("--eval-file", default=str(DEFAULT_EVAL))
+    parser.add_argument("--leave-one-out", action="store_true", help="Evaluate on the exemplars themselves")
+    parser.add_argument("--min-score", nargs="+", type=float,
+                        default=[float(os.getenv("ROUTER_MIN_SCORE", "0.45"))])
+    parser.add_argument("--min-margin", nargs="+", type=float,
+                        default=[float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))])
+    parser.add_argument("--top-k", type=int, default=int(os.getenv("ROUTER_TOP_K", "3")))
+    parser.add_argument("--output", help="Write the result rows as JSON")
+    args = parser.parse_args(argv)
+
+    exemplars = load_exemplars(Path(args.exemplars) if args.exemplars else None)
+    exemplar_labels, exemplar_texts = _flatten(exemplars)
+    exemplar_vectors = _embed(exemplar_texts, args.embedder, args.dim)
+    if args.leave_one_out:
+        labels, vectors = exemplar_labels, exemplar_vectors
+    else:
+        labels, texts = _flatten(json.loads(Path(args.eval_file).read_text()))
+        vectors = _embed(texts, args.embedder, args.dim)
+
+    rows = []
+    for min_score in args.min_score:
+        for min_margin in args.min_margin:
+            router = EmbeddingRouter(exemplar_labels, exemplar_vectors, min_score, min_margin, args.top_k)
+            rows.append(evaluate(router, labels, vectors, skip_self=args.leave_one_out))
+
+    header = f"{'min_score':>10}{'min_margin':>11}{'accuracy':>10}{'coverage':>10}{'precision':>11}" \
+             f"{'calls saved':>13}{'p50 us':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['min_score']:>10.2f}{row['min_margin']:>11.2f}{row['accuracy']:>10.3f}{row['coverage']:>10.3f}"
+              f"{row['precision']:>11.3f}{row['calls_saved']:>13.2f}{row['classify_us_p50']:>9.1f}")
+
+    print(f"\nConfusion (label -> prediction) at min_score={rows[0]['min_score']}, "
+          f"min_margin={rows[0]['min_margin']}:")
+    for label, predictions in rows[0]["confusion"].items():
+        print(f"  {label:<15}" + ", ".join(f"{p}: {n}" for p, n in sorted(predictions.items())))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,228 +1,543 @@
-from typing import List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 from langchain.agents import initialize_agent, AgentType, Tool
 from langchain.agents import AgentExecutor
 from langchain_community.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
+from langchain.prompts import MessagesPlaceholder
 from sqlalchemy.orm import Session
 
-from langchain_experimental.sql.base import SQLDatabase
 from langchain_experimental.sql import SQLDatabaseChain
 
 from duckduckgo_search import DDGS
+import asyncio
+import json
 import os
 import logging
-
-from rag.agentic_rag.db import get_vector_store_index, get_engine
+import time
+
+from rag.agentic_rag.cascade import CascadeConfig, decide
+from rag.agentic_rag.context_packing import pack_nodes
+from rag.agentic_rag.db import get_vector_store_index
+from rag.agentic_rag.guardrails import apply_guardrails
+from rag.agentic_rag.instrumentation import RERANK_DECISIONS, STAGE_FALLBACKS, STAGE_LATENCY, STAGE_TOKENS
+from rag.agentic_rag.llm_clients import langchain_kwargs
+from rag.agentic_rag.output_guard import OUTPUT_GUARD
+from rag.agentic_rag.registry import PIPELINE, PipelineRegistry
+from rag.agentic_rag.router import QUERY_LATENCY, ROUTER_DECISIONS
+from rag.agentic_rag.sessions import SessionStore, build_memory
+from rag.agentic_rag.sql_tool import SQL_RESULT_CACHE, GuardedSQLDatabase
+from rag.agentic_rag.tokens import count_tokens
+from rag.agentic_rag.tool_cache import TOOL_CACHE
+from rag.agentic_rag.tool_limits import bounded_call, bounded_coroutine
+from rag.observability.tracing import current_trace_id, end_span, span, start_span
 
 logger = logging.getLogger(__name__)
+cascade_logger = logging.getLogger("rag.agentic_rag.cascade")
+router_logger = logging.getLogger("rag.agentic_rag.router")
 
 
 # ----------------------------------------------------------------------------
 # LangChain Agent Setup
 # ----------------------------------------------------------------------------
 
-def get_agent_instance(db: Session) -> AgentExecutor:
+def get_agent_instance(db: Session, session_id: Optional[str] = None) -> AgentExecutor:
+    """
+    Agent for `session_id` with its own bounded memory (see `sessions`);
+    without a session id, a shared agent that keeps no history.
+    """
+    if session_id is not None:
+        return AGENT_SESSIONS.get(session_id).value
     if not hasattr(get_agent_instance, "_agent"):
         get_agent_instance._agent = create_agent(db)
     return get_agent_instance._agent
 
 
-def create_agent(db: Session) -> AgentExecutor:
+async def run_agent(question: str, db: Session, session_id: Optional[str] = None) -> str:
+    """
+    Answer via the router when it is confident, otherwise via the agent.
+    Follow-up turns of a session with history always go to the agent,
+    which sees the conversation.
+    """
+    start = time.perf_counter()
+    if session_id is None:
+        answer = await _routed_answer(question, db)
+        path = "routed" if answer is not None else "agent"
+        if answer is None:
+            result = await get_agent_instance(db).ainvoke({"input": question})
+            answer = result["output"]
+    else:
+        session = AGENT_SESSIONS.get(session_id)
+        # Turns of one conversation must not interleave in its memory.
+        async with session.lock:
+            memory = session.value.memory
+            answer = None
+            # Async memory calls: the history may be in Postgres, and the
+            # summary memory may call the LLM when saving.
+            if not (await memory.aload_memory_variables({}))["chat_history"]:
+                answer = await _routed_answer(question, db)
+            path = "routed" if answer is not None else "agent"
+            if answer is None:
+                result = await session.value.ainvoke({"input": question})
+                answer = result["output"]
+            else:
+                await memory.asave_context({"input": question}, {"output": answer})
+    QUERY_LATENCY.observe(time.perf_counter() - start, path=path)
+    return answer
+
+
+ROUTED_ANSWER_PROMPT = (
+    "Answer the question using only the search results below. "
+    "If they do not contain the answer, say so.\n\n"
+    "Question: {question}\n\nSearch results:\n{results}\n\nAnswer:"
+)
+# Routes whose tool output is raw material rather than an answer.
+SYNTHESIZED_ROUTES = {"web_search"}
+
+
+async def _routed_answer(question: str, db: Session) -> Optional[str]:
+    """
+    Skip the agent's tool-selection call when the embedding router is
+    confident: run the chosen tool directly (vector_search and sql_query
+    already return an answer; web_search results get one synthesis call).
+    `None` means the agent should handle the question.
+    """
+    pipeline = PIPELINE
+    if not pipeline.is_ready or pipeline.router is None:
+        return None
+    try:
+        embedding = await pipeline.embed_model.aget_query_embedding(question)
+    except Exception as exc:
+        logger.warning(f"Router embedding failed: {exc!r}")
+        return None
+    decision = pipeline.router.classify(embedding)
+    router_logger.info(json.dumps({"trace_id": current_trace_id(), **decision.as_dict()}))
+    if not decision.confident:
+        ROUTER_DECISIONS.inc(route=decision.route, outcome="fallback")
+        return None
+
+    llm, _, lookups = _agent_components(db)
+    try:
+        with span("router", route=decision.route):
+            result = await bounded_call(decision.route, lookups[decision.route], question)
+            if decision.route in SYNTHESIZED_ROUTES:
+                message = await llm.ainvoke(ROUTED_ANSWER_PROMPT.format(question=question, results=result))
+                result = message.content
+    except Exception as exc:
+        ROUTER_DECISIONS.inc(route=decision.route, outcome="tool_error")
+        logger.warning(f"Routed {decision.route} failed, falling back to the agent: {exc!r}")
+        return None
+    ROUTER_DECISIONS.inc(route=decision.route, outcome="routed")
+    return result
+
+
+def _agent_components(db: Session) -> Tuple[ChatOpenAI, List[Tool], Dict[str, Callable[[str], str]]]:
+    """LLM, tools and the tools' raw lookups, built once and shared by every session's agent."""
+    if not hasattr(_agent_components, "_components"):
+        _agent_components._components = _create_agent_components(db)
+    return _agent_components._components
+
+
+def create_agent(db: Session, session_id: Optional[str] = None) -> AgentExecutor:
+    # The multi-functions agent may request several tools in one step; the
+    # executor gathers them, so independent lookups run concurrently and
+    # their observations come back in the order the model asked for them.
+    llm, tools, _ = _agent_components(db)
+    if session_id is None:
+        return initialize_agent(tools=tools, llm=llm, agent=AgentType.OPENAI_MULTI_FUNCTIONS, verbose=True)
+
+    return initialize_agent(
+        tools=tools,
+        llm=llm,
+        agent=AgentType.OPENAI_MULTI_FUNCTIONS,
+        verbose=True,
+        memory=build_memory(session_id, llm),
+        agent_kwargs={"extra_prompt_messages": [MessagesPlaceholder(variable_name="chat_history")]},
+    )
+
+
+AGENT_SESSIONS: SessionStore[AgentExecutor] = SessionStore(lambda session_id: create_agent(None, session_id))
+
+
+def _create_agent_components(db: Session) -> Tuple[ChatOpenAI, List[Tool], Dict[str, Callable[[str], str]]]:
     llm = ChatOpenAI(
         model_name="gpt-3.5-turbo-1106",
         temperature=0,
-        api_key=os.getenv("OPENAI_API_KEY")
+        api_key=os.getenv("OPENAI_API_KEY"),
+        **langchain_kwargs(),
     )
 
     index = get_vector_store_index("li_document")
     query_engine = index.as_query_engine(similarity_top_k=10, show_progress=True)
 
-    engine = get_engine()
-    sql_db = SQLDatabase(engine)
+    sql_db = GuardedSQLDatabase.from_env(cache=SQL_RESULT_CACHE)
     sql_chain = SQLDatabaseChain.from_llm(llm, sql_db, verbose=True)
 
+    def _vector_search(query: str) -> str:
+        with span("tool", tool="vector_search"):
+            response = query_engine.query(query)
+        source_nodes = getattr(response, "source_nodes", [])
+        logger.debug(f"Response: {source_nodes}")
+        for i, node in enumerate(source_nodes):
+            logger.debug(f"[Node {i}] Score: {node.score}, Text: {node.node.get_content()[:200]}")
+        return str(response)
+
+    def _sql_query(query: str) -> str:
+        with span("tool", tool="sql_query"):
+            return sql_chain.run(query)
+
+    def _web_search(query: str) -> str:
+        with span("tool", tool="web_search"):
+            ddgs = DDGS()
+            results = ddgs.text(keywords=query, max_results=5)
+        if not results:
+            return "No search results found."
+        snippets = [res.get("body", "") or res.get("snippet", "") for res in results]
+        return "\n".join(snippets)
+
+    # Cached lookups raise on failure; the router calls these directly.
+    lookups = {
+        "vector_search": _cached("vector_search", _vector_search),
+        "sql_query": _cached("sql_query", _sql_query),
+        "web_search": _cached("web_search", _web_search),
+    }
+
+    # Failures return a message to the agent and are never cached.
     def vector_search_tool(query: str) -> str:
         try:
-            response = query_engine.query(query)
-            source_nodes = getattr(response, "source_nodes", [])
-            logger.info(f"Response: {source_nodes}")
-            for i, node in enumerate(source_nodes):
-                logger.info(f"[Node {i}] Score: {node.score}, Text: {node.node.get_content()[:200]}")
-            return str(response)
+            return lookups["vector_search"](query)
         except Exception as e:
             logger.warning(f"Vector search failed: {e}")
             return "Vector search failed."
 
     def sql_query_tool(query: str) -> str:
         try:
-            return sql_chain.run(query)
+            return lookups["sql_query"](query)
         except Exception as exc:
             return f"SQL error: {exc}"
 
     def web_search_tool(query: str) -> str:
         try:
-            ddgs = DDGS()
-            results = ddgs.text(keywords=query, max_results=5)
-            if not results:
-                return "No search results found."
-            snippets = [res.get("body", "") or res.get("snippet", "") for res in results]
-            return "\n".join(snippets)
+            return lookups["web_search"](query)
         except Exception as exc:
             return f"Search error: {exc}"
 
     tools: List[Tool] = [
-        Tool(name="vector_search", func=vector_search_tool, description="Search internal documents."),
-        Tool(name="sql_query", func=sql_query_tool, description="Query the SQL database."),
-        Tool(name="web_search", func=web_search_tool, description="Search the web when internal sources are insufficient.")
+        Tool(name="vector_search", func=vector_search_tool, description="Search internal documents.",
+             coroutine=bounded_coroutine("vector_search", vector_search_tool)),
+        Tool(name="sql_query", func=sql_query_tool, description="Query the SQL database.",
+             coroutine=bounded_coroutine("sql_query", sql_query_tool)),
+        Tool(name="web_search", func=web_search_tool, description="Search the web when internal sources are insufficient.",
+             coroutine=bounded_coroutine("web_search", web_search_tool)),
     ]
 
-    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    return llm, tools, lookups
 
-    return initialize_agent(
-        tools=tools,
-        llm=llm,
-        agent=AgentType.OPENAI_FUNCTIONS,
-        verbose=True,
-        memory=memory,
-    )
 
+def _cached(tool: str, compute: Callable[[str], str]) -> Callable[[str], str]:
+    def lookup(query: str) -> str:
+        return TOOL_CACHE.get_or_compute(tool, query, lambda: compute(query))
+    return lookup
 
-async def get_contextual_answer(question: str, db: Session) -> str:
+
+async def stream_agent_answer(question: str, db: Session,
+                              session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
     """
-    End-to-end retrieval + reranking + synthesis + guardrails.
+    Streaming variant of the `/query` agent run.
+
+    Yields an `action` event for each tool call the agent decides on, an
+    `observation` event with the tool result and a final `done` event.
     """
+    if session_id is None:
+        async for event in _stream_agent(get_agent_instance(db), question):
+            yield event
+        return
+    session = AGENT_SESSIONS.get(session_id)
+    async with session.lock:
+        async for event in _stream_agent(session.value, question):
+            yield event
+
+
+async def _stream_agent(agent: AgentExecutor, question: str) -> AsyncIterator[Tuple[str, Any]]:
+    async for chunk in agent.astream({"input": question}):
+        for action in chunk.get("actions", []):
+            yield "action", {"tool": action.tool, "input": str(action.tool_input)}
+        for step in chunk.get("steps", []):
+            yield "observation", {"tool": step.action.tool, "output": str(step.observation)}
+        if "output" in chunk:
+            yield "done", {"answer": chunk["output"]}
 
-    try:
-        from llama_index.core.response_synthesizers import CompactAndRefine
-        from llama_index.core.postprocessor.llm_rerank import LLMRerank
-        from llama_index.llms.openai import OpenAI as LlamaOpenAI
-        LLAMAINDEX_AVAILABLE = True
-    except Exception:
-        LLAMAINDEX_AVAILABLE = False
 
-    try:
-        from FlagEmbedding import FlagReranker
-        FLAG_RERANKER_AVAILABLE = True
-    except Exception:
-        FLAG_RERANKER_AVAILABLE = False
+# ----------------------------------------------------------------------------
+# Contextual answer pipeline
+# ----------------------------------------------------------------------------
 
-    try:
-        from nemoguardrails import LLMRails, RailsConfig
-        GUARDRAILS_AVAILABLE = True
-    except Exception:
-        GUARDRAILS_AVAILABLE = False
+ANSWER_PREFIX = "Meeting started by abc@abc.com "
+ANSWER_SUFFIX = " Finally meeting ended by bva@abc.com"
 
-    openai_key = os.getenv("OPENAI_API_KEY")
 
-    # ------------------------------------------------------------------
-    # 1. Retrieval from PGVector
-    # ------------------------------------------------------------------
-    if not LLAMAINDEX_AVAILABLE:
-        logger.info("LlamaIndex not available; falling back to LangChain agent.")
-        agent = get_agent_instance(db)
-        return agent.run(question)
+def _node_summary(node) -> Dict[str, Any]:
+    return {
+        "id": str(node.node.node_id),
+        "score": node.score or 0.0,
+        "text_snippet": node.node.get_content()[:200],
+    }
+
+
+def _stage_timeout(stage: str, default: float) -> float:
+    return float(os.getenv(f"RAG_TIMEOUT_{stage.upper()}", default))
 
-    index = get_vector_store_index("li_document")
-    query_engine = index.as_query_engine(similarity_top_k=5)
-    response = query_engine.query(question)
 
-    nodes = response.source_nodes or []
+# Per-stage timeouts in seconds, overridable via RAG_TIMEOUT_<STAGE>.
+STAGE_TIMEOUTS = {
+    "retrieval": _stage_timeout("retrieval", 10.0),
+    "llm_rerank": _stage_timeout("llm_rerank", 15.0),
+    "flag_rerank": _stage_timeout("flag_rerank", 10.0),
+    "synthesis": _stage_timeout("synthesis", 30.0),
+}
+
+RERANK_CASCADE = CascadeConfig.from_env()
+
+async def _retrieve(pipeline: PipelineRegistry, question: str) -> list:
+    # Retriever only: the query engine would also synthesize an answer we discard.
+    try:
+        with STAGE_LATENCY.time(stage="retrieval"), span("retrieval", top_k=5):
+            retriever = pipeline.index.as_retriever(similarity_top_k=5)
+            nodes = await asyncio.wait_for(retriever.aretrieve(question), STAGE_TIMEOUTS["retrieval"]) or []
+    except asyncio.TimeoutError:
+        STAGE_FALLBACKS.inc(stage="retrieval")
+        logger.warning(f"Retrieval timed out after {STAGE_TIMEOUTS['retrieval']}s.")
+        return []
+    STAGE_TOKENS.inc(count_tokens(question), stage="retrieval", kind="prompt")
     logger.info(f"Retrieved {len(nodes)} documents from vector store.")
-    logger.info(f"Retrieved Nodes: {nodes}")
-    reranked_nodes = nodes
+    logger.debug(f"Retrieved Nodes: {nodes}")
+    return nodes
+
 
-    # ------------------------------------------------------------------
-    # 2. Rerank using OpenAI LLM reranker
-    # ------------------------------------------------------------------
+async def _llm_rerank(pipeline: PipelineRegistry, question: str, nodes: list,
+                      timeout: Optional[float] = None) -> list:
     try:
         logger.info(f"Applying LLM reranker to {len(nodes)} nodes.")
-        ranker = LLMRerank(
-            choice_batch_size=5,
-            top_n=3,
-            llm=LlamaOpenAI(model="gpt-3.5-turbo", api_key=openai_key),
-        )
-        reranked_nodes = ranker.postprocess_nodes(nodes, query_str=question)
+        with STAGE_LATENCY.time(stage="llm_rerank"), span("llm", stage="llm_rerank", nodes=len(nodes)):
+            reranked_nodes = await asyncio.wait_for(
+                pipeline.llm_reranker.apostprocess_nodes(nodes, query_str=question),
+                timeout if timeout is not None else STAGE_TIMEOUTS["llm_rerank"],
+            )
+        prompt = question + "".join(n.node.get_content() for n in nodes)
+        STAGE_TOKENS.inc(count_tokens(prompt), stage="llm_rerank", kind="prompt")
         logger.info(f"LLM reranker selected {len(reranked_nodes)} nodes.")
-        logger.info(f"LLM reranker selected nodes {reranked_nodes}")
+        logger.debug(f"LLM reranker selected nodes {reranked_nodes}")
+        return reranked_nodes
     except Exception as exc:
-        logger.warning(f"LLM reranker failed: {exc}")
+        STAGE_FALLBACKS.inc(stage="llm_rerank")
+        logger.warning(f"LLM reranker failed: {exc!r}")
+        return nodes
+
+
+async def _flag_rerank(pipeline: PipelineRegistry, question: str, nodes: list) -> Tuple[list, Optional[List[float]]]:
+    """All `nodes` ordered by cross-encoder score, with the scores; `None` scores if it could not run."""
+    if pipeline.reranker is None:
+        STAGE_FALLBACKS.inc(stage="flag_rerank")
+        return nodes, None
 
-    # ------------------------------------------------------------------
-    # 3. Rerank using FlagEmbedding (if available)
-    # ------------------------------------------------------------------
+    if not nodes:
+        return nodes, []
     try:
-        if FLAG_RERANKER_AVAILABLE and reranked_nodes:
-            logger.info(f"Applying FlagEmbedding reranker to {len(reranked_nodes)} nodes.")
-            if not hasattr(get_contextual_answer, "_flag_reranker"):
-                get_contextual_answer._flag_reranker = FlagReranker("BAAI/bge-reranker-base", use_fp16=True)
-            reranker = get_contextual_answer._flag_reranker
-            pairs = [[question, n.node.get_content()] for n in reranked_nodes]
-            scores = reranker.compute_score(pairs)
-            reranked_nodes = [
-                n for _, n in sorted(zip(scores, reranked_nodes), key=lambda x: x[0], reverse=True)
-            ][:3]
-            logger.info(f"Flag reranker selected {len(reranked_nodes)} nodes.")
-            logger.info(f"Flag reranker selected nodes {reranked_nodes}")
-            
+        logger.info(f"Applying cross-encoder reranker to {len(nodes)} nodes.")
+        backend = pipeline.reranker.backend.name
+        with STAGE_LATENCY.time(stage="flag_rerank"), span("reranker", backend=backend, pairs=len(nodes)):
+            # Queued with concurrent requests and scored in one shared batch.
+            pairs = [(question, n.node.get_content()) for n in nodes]
+            scores = await asyncio.wait_for(
+                pipeline.reranker.score(pairs),
+                STAGE_TIMEOUTS["flag_rerank"],
+            )
+        ranked = sorted(zip(scores, nodes), key=lambda x: x[0], reverse=True)
+        logger.debug(f"Cross-encoder scores {[round(s, 3) for s, _ in ranked]}")
+        return [n for _, n in ranked], [s for s, _ in ranked]
     except Exception as exc:
-        logger.warning(f"FlagEmbedding reranker failed: {exc}")
+        STAGE_FALLBACKS.inc(stage="flag_rerank")
+        logger.warning(f"Cross-encoder reranker failed: {exc!r}")
+        return nodes, None
+
 
-    # ------------------------------------------------------------------
-    # 4. Answer synthesis
-    # ------------------------------------------------------------------
+async def _rerank(pipeline: PipelineRegistry, question: str, nodes: list) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Cross-encoder first, then the LLM reranker only when `cascade.decide`
+    finds the cross-encoder result ambiguous (see `CascadeConfig`).
+
+    Yields one `rerank` payload per stage that ran; the last one holds the
+    selected nodes. Every decision is logged as a JSON line on the
+    `rag.agentic_rag.cascade` logger so the thresholds can be tuned.
+    """
+    config = RERANK_CASCADE
+    start = time.perf_counter()
+    ranked, scores = await _flag_rerank(pipeline, question, nodes)
+    if scores is not None:
+        yield {"stage": "flag", "nodes": [_node_summary(n) for n in ranked[:config.top_n]]}
+
+    remaining_ms = config.budget_ms - (time.perf_counter() - start) * 1000.0
+    decision = decide(config, scores, remaining_ms)
+    RERANK_DECISIONS.inc(decision="llm" if decision.run_llm else "skip", reason=decision.reason)
+    cascade_logger.info(json.dumps({
+        "trace_id": current_trace_id(), "candidates": len(nodes),
+        "scores": None if scores is None else [round(s, 4) for s in scores], **decision.as_dict(),
+    }))
+
+    if decision.run_llm and ranked:
+        candidates = ranked[:config.llm_candidates]
+        ranked = await _llm_rerank(pipeline, question, candidates, timeout=min(
+            STAGE_TIMEOUTS["llm_rerank"], decision.remaining_ms / 1000.0))
+        yield {"stage": "llm", "nodes": [_node_summary(n) for n in ranked[:config.top_n]],
+               "decision": decision.as_dict()}
+    elif scores is None:
+        yield {"stage": "none", "nodes": [_node_summary(n) for n in ranked[:config.top_n]],
+               "decision": decision.as_dict()}
+
+    yield {"selected": ranked[:config.top_n]}
+
+
+def _pack_context(nodes: list) -> list:
+    """Merge neighbouring chunks, drop repeated sentences and fit CONTEXT_TOKEN_BUDGET."""
+    if not nodes:
+        return nodes
     try:
-        synthesiser = CompactAndRefine(
-            llm=LlamaOpenAI(model="gpt-3.5-turbo", api_key=openai_key),
-            verbose=False,
-        )
-        response = synthesiser.synthesize(question, nodes=reranked_nodes)
-        answer_text = "Meeting started by abc@abc.com " + response.response + " Finally meeting ended by bva@abc.com"
+        with STAGE_LATENCY.time(stage="packing"), span("packing", nodes=len(nodes)):
+            packed = pack_nodes(nodes)
+    except Exception as exc:
+        STAGE_FALLBACKS.inc(stage="packing")
+        logger.warning(f"Context packing failed: {exc!r}")
+        return nodes
+    before = sum(count_tokens(n.node.get_content()) for n in nodes)
+    after = sum(count_tokens(n.node.get_content()) for n in packed)
+    STAGE_TOKENS.inc(max(0, before - after), stage="packing", kind="saved")
+    logger.info(f"Packed {len(nodes)} chunks into {len(packed)} blocks ({before} -> {after} tokens).")
+    return packed
+
 
+def _record_synthesis_tokens(question: str, nodes: list, answer: str) -> None:
+    prompt = question + "".join(n.node.get_content() for n in nodes)
+    STAGE_TOKENS.inc(count_tokens(prompt), stage="synthesis", kind="prompt")
+    STAGE_TOKENS.inc(count_tokens(answer), stage="synthesis", kind="completion")
+
+
+async def _synthesize(pipeline: PipelineRegistry, question: str, nodes: list) -> str:
+    try:
+        with STAGE_LATENCY.time(stage="synthesis"), span("llm", stage="synthesis", nodes=len(nodes)):
+            response = await asyncio.wait_for(
+                pipeline.synthesizer.asynthesize(question, nodes=nodes),
+                STAGE_TIMEOUTS["synthesis"],
+            )
+        _record_synthesis_tokens(question, nodes, response.response)
+        answer_text = ANSWER_PREFIX + response.response + ANSWER_SUFFIX
+        logger.info("Synthesis complete.")
+        logger.debug(f"Synthesized answer {answer_text}")
+        return answer_text
+    except Exception as exc:
+        STAGE_FALLBACKS.inc(stage="synthesis")
+        logger.warning(f"Synthesis failed: {exc!r}")
+        return "\n\n".join([n.node.get_content() for n in nodes])
+
+
+async def _synthesize_stream(pipeline: PipelineRegistry, question: str, nodes: list) -> AsyncIterator[str]:
+    """Token stream counterpart of `_synthesize`; the timeout bounds the whole stream."""
+    emitted = False
+    tokens: List[str] = []
+    start = time.perf_counter()
+    deadline = start + STAGE_TIMEOUTS["synthesis"]
+    handle = start_span("llm", stage="synthesis", nodes=len(nodes), streaming=True)
+    try:
+        response = await asyncio.wait_for(
+            pipeline.streaming_synthesizer.asynthesize(question, nodes=nodes),
+            STAGE_TIMEOUTS["synthesis"],
+        )
+        yield ANSWER_PREFIX
+        emitted = True
+        token_iter = response.async_response_gen().__aiter__()
+        while True:
+            try:
+                token = await asyncio.wait_for(token_iter.__anext__(), max(0.0, deadline - time.perf_counter()))
+            except StopAsyncIteration:
+                break
+            tokens.append(token)
+            yield token
+        yield ANSWER_SUFFIX
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="synthesis")
+        _record_synthesis_tokens(question, nodes, "".join(tokens))
         logger.info("Synthesis complete.")
-        logger.info(f"Synthesized answer {answer_text}")
     except Exception as exc:
-        logger.warning(f"Synthesis failed: {exc}")
-        answer_text = "\n\n".join([n.node.get_content() for n in reranked_nodes])
+        STAGE_FALLBACKS.inc(stage="synthesis")
+        logger.warning(f"Synthesis failed: {exc!r}")
+        if not emitted:
+            yield "\n\n".join([n.node.get_content() for n in nodes])
+    finally:
+        end_span(handle)
 
-    # ------------------------------------------------------------------
-    # 5. Guardrails (mask emails, async-safe)
-    # ------------------------------------------------------------------
-    import re
-    EMAIL_RE = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
 
-    def mask_emails(text: str) -> str:
-        return EMAIL_RE.sub("[***]", text)
+async def get_contextual_answer(question: str, db: Session) -> str:
+    """
+    End-to-end retrieval + reranking + synthesis + guardrails.
 
-    if GUARDRAILS_AVAILABLE:
-        from nemoguardrails.llm.types import Task
-        try:
-            config = RailsConfig.from_path("RailConfigPath")
-            rails = LLMRails(config)
-            rails.register_output_parser(mask_emails, name="mask_emails")
-
-            guarded = await rails.generate_async(messages=[
-                {"role": "user", "content": question},
-                {"role": "assistant", "content": answer_text},
-            ])
-
-            parsed = rails.runtime.llm_task_manager.parse_task_output(
-                task=Task.GENERATE_BOT_MESSAGE,
-                output=guarded["content"],
-                forced_output_parser="mask_emails"
-            )
-            answer_text = parsed.text
-            logger.info("Guardrails applied.")
-            logger.info(f"Guardrails output {answer_text}")
-        except Exception as exc:
-            logger.warning(f"Guardrails failed: {exc}")
-            # minimal fallback
-            answer_text = mask_emails(answer_text)
-    else:
-        answer_text = mask_emails(answer_text)
+    Every stage is awaited rather than called synchronously, so one slow
+    question no longer stalls the other requests on this worker. Models,
+    clients and rails come from the startup registry.
+    """
+    pipeline = await PIPELINE.ready()
+    if not pipeline.llamaindex_available:
+        logger.info("LlamaIndex not available; falling back to LangChain agent.")
+        STAGE_FALLBACKS.inc(stage="pipeline")
+        return await run_agent(question, db)
 
-    return answer_text
+    nodes = await _retrieve(pipeline, question)
+    reranked_nodes = nodes
+    async for step in _rerank(pipeline, question, nodes):
+        reranked_nodes = step.get("selected", reranked_nodes)
+    context_nodes = _pack_context(reranked_nodes)
+    answer_text = await _synthesize(pipeline, question, context_nodes)
+    return await apply_guardrails(question, answer_text, rails=pipeline.rails, load=pipeline.get_rails)
 
-    
 
+async def stream_contextual_answer(question: str, db: Session) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of `get_contextual_answer`.
+
+    Yields `(event, data)` pairs: `retrieval`, `rerank` (once per rerank
+    stage that ran), `token` for each masked chunk of the answer and a final
+    `done`. The first event is sent as soon as retrieval finishes. The
+    output guard masks incrementally; the LLM output rails need the
+    complete answer and are not run here, so `done` lists the detectors
+    that would have escalated to them under `flagged`.
+    """
+    masker = OUTPUT_GUARD.stream()
+    pipeline = await PIPELINE.ready()
 
+    if not pipeline.llamaindex_available:
+        logger.info("LlamaIndex not available; falling back to LangChain agent.")
+        STAGE_FALLBACKS.inc(stage="pipeline")
+        answer = await run_agent(question, db)
+        answer = masker.feed(answer) + masker.flush()
+        yield "token", {"text": answer}
+        yield "done", {"answer": answer, "flagged": masker.flagged}
+        return
 
+    nodes = await _retrieve(pipeline, question)
+    yield "retrieval", {"nodes": [_node_summary(n) for n in nodes]}
+
+    reranked_nodes = nodes
+    async for step in _rerank(pipeline, question, nodes):
+        if "selected" in step:
+            reranked_nodes = step["selected"]
+        else:
+            yield "rerank", step
+
+    answer_parts: List[str] = []
+    context_nodes = _pack_context(reranked_nodes)
+    async for token in _synthesize_stream(pipeline, question, context_nodes):
+        masked = masker.feed(token)
+        if masked:
+            answer_parts.append(masked)
+            yield "token", {"text": masked}
+    tail = masker.flush()
+    if tail:
+        answer_parts.append(tail)
+        yield "token", {"text": tail}
+
+    yield "done", {"answer": "".join(answer_parts), "flagged": masker.flagged}
@@ -0,0 +1,94 @@
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+MODES = ("cascade", "always", "never")
+
+
+class CascadeConfig:
+    """
+    When the LLM reranker runs after the cross-encoder.
+
+    `mode` is `cascade` (only on ambiguous results), `always` or `never`.
+    Cross-encoder scores are squashed to 0..1 before comparing them with
+    `min_top_score` (the best hit must be at least this relevant) and
+    `min_margin` (and this far ahead of the runner-up). `budget_ms` bounds
+    the whole rerank step of one request; the LLM pass is skipped when less
+    than `min_llm_ms` of it is left, and otherwise gets the remainder as
+    its timeout.
+    """
+
+    def __init__(self, mode: str = "cascade", min_top_score: float = 0.5, min_margin: float = 0.15,
+                 budget_ms: float = 8000.0, min_llm_ms: float = 1500.0, llm_candidates: int = 5,
+                 top_n: int = 3):
+        if mode not in MODES:
+            raise ValueError(f"Unknown rerank cascade mode: {mode}")
+        self.mode = mode
+        self.min_top_score = min_top_score
+        self.min_margin = min_margin
+        self.budget_ms = budget_ms
+        self.min_llm_ms = min_llm_ms
+        self.llm_candidates = llm_candidates
+        self.top_n = top_n
+
+    @classmethod
+    def from_env(cls) -> "CascadeConfig":
+        return cls(
+            mode=os.getenv("RERANK_CASCADE_MODE", "cascade"),
+            min_top_score=float(os.getenv("RERANK_CASCADE_MIN_TOP", "0.5")),
+            min_margin=float(os.getenv("RERANK_CASCADE_MIN_MARGIN", "0.15")),
+            budget_ms=float(os.getenv("RERANK_BUDGET_MS", "8000")),
+            min_llm_ms=float(os.getenv("RERANK_CASCADE_MIN_LLM_MS", "1500")),
+            llm_candidates=int(os.getenv("RERANK_CASCADE_LLM_CANDIDATES", "5")),
+            top_n=int(os.getenv("RERANK_TOP_N", "3")),
+        )
+
+
+class CascadeDecision:
+    def __init__(self, run_llm: bool, reason: str, top_score: Optional[float] = None,
+                 margin: Optional[float] = None, remaining_ms: Optional[float] = None):
+        self.run_llm = run_llm
+        self.reason = reason
+        self.top_score = top_score
+        self.margin = margin
+        self.remaining_ms = remaining_ms
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "decision": "llm" if self.run_llm else "skip",
+            "reason": self.reason,
+            "top_score": None if self.top_score is None else round(self.top_score, 4),
+            "margin": None if self.margin is None else round(self.margin, 4),
+            "remaining_ms": None if self.remaining_ms is None else round(self.remaining_ms, 1),
+        }
+
+
+def normalize(score: float) -> float:
+    """Sigmoid of a raw cross-encoder logit."""
+    return 1.0 / (1.0 + math.exp(-max(-60.0, min(60.0, score))))
+
+
+def decide(config: CascadeConfig, scores: Optional[List[float]], remaining_ms: float) -> CascadeDecision:
+    """
+    Whether the LLM reranker should run, given the cross-encoder `scores`
+    (raw, sorted best first; `None` if the cross-encoder was unavailable).
+    """
+    if config.mode == "never":
+        return CascadeDecision(False, "disabled", remaining_ms=remaining_ms)
+    if remaining_ms < config.min_llm_ms:
+        return CascadeDecision(False, "budget", remaining_ms=remaining_ms)
+    if scores is None:
+        return CascadeDecision(True, "no_cross_encoder", remaining_ms=remaining_ms)
+    if len(scores) < 2:
+        return CascadeDecision(config.mode == "always", "always" if config.mode == "always" else "single_hit",
+                               remaining_ms=remaining_ms)
+
+    top, second = normalize(scores[0]), normalize(scores[1])
+    margin = top - second
+    if config.mode == "always":
+        return CascadeDecision(True, "always", top, margin, remaining_ms)
+    if top < config.min_top_score:
+        return CascadeDecision(True, "low_top_score", top, margin, remaining_ms)
+    if margin < config.min_margin:
+        return CascadeDecision(True, "small_margin", top, margin, remaining_ms)
+    return CascadeDecision(False, "clear_top_hit", top, margin, remaining_ms)
@@ -0,0 +1,166 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from rag.agentic_rag.tokens import count_tokens
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_RE = re.compile(r"\w+")
+
+# Context tokens handed to synthesis. Well below the model's window, so
+# CompactAndRefine fits everything into one call.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Shortest tail/head overlap treated as the splitter's chunk overlap.
+MIN_OVERLAP_CHARS = int(os.getenv("CONTEXT_MIN_OVERLAP_CHARS", "30"))
+MAX_OVERLAP_CHARS = 400
+# Word-set Jaccard similarity above which a sentence counts as a repeat.
+DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.85"))
+
+
+class Block:
+    """Contiguous text from one source; `rank` is the best rank among its chunks."""
+
+    def __init__(self, text: str, source: Optional[str], rank: int, position: Optional[int], ids: List[str]):
+        self.text = text
+        self.source = source
+        self.rank = rank
+        self.position = position
+        self.ids = ids
+
+
+def overlap(a: str, b: str, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (0 if shorter than `min_chars`)."""
+    for k in range(min(len(a), len(b), MAX_OVERLAP_CHARS), min_chars - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _join(a: Block, b: Block) -> Optional[Block]:
+    """`a` followed by `b` if they overlap, contain one another or are adjacent chunks; else `None`."""
+    if b.text in a.text:
+        text = a.text
+    elif a.text in b.text:
+        text = b.text
+    else:
+        k = overlap(a.text, b.text)
+        adjacent = a.position is not None and b.position is not None and b.position == a.position + 1
+        if k:
+            text = a.text + b.text[k:]
+        elif adjacent:
+            text = a.text + "\n" + b.text
+        else:
+            return None
+    return Block(text, a.source, min(a.rank, b.rank), b.position if b.position is not None else a.position,
+                 a.ids + b.ids)
+
+
+def merge_blocks(blocks: List[Block]) -> List[Block]:
+    """Merge overlapping and adjacent chunks of the same source; ordered by best rank."""
+    by_source: Dict[Any, List[Block]] = {}
+    for block in blocks:
+        key = block.source if block.source is not None else ("", block.ids[0])
+        by_source.setdefault(key, []).append(block)
+
+    merged: List[Block] = []
+    for group in by_source.values():
+        if all(b.position is not None for b in group):
+            group.sort(key=lambda b: b.position)
+        changed = True
+        while changed and len(group) > 1:
+            changed = False
+            for i in range(len(group)):
+                for j in range(len(group)):
+                    if i == j:
+                        continue
+                    joined = _join(group[i], group[j])
+                    if joined is not None:
+                        group = [b for n, b in enumerate(group) if n not in (i, j)]
+                        group.insert(min(i, j), joined)
+                        changed = True
+                        break
+                if changed:
+                    break
+        merged.extend(group)
+    return sorted(merged, key=lambda b: b.rank)
+
+
+def _is_repeat(key: str, words: Set[str], seen_keys: List[str], seen_words: List[Set[str]],
+               threshold: float) -> bool:
+    """
+    Same words in the same order (ignoring case and punctuation), a fragment
+    of a kept sentence (chunk boundaries cut sentences), or nearly the same
+    word set where the differing words carry no numbers (so "3.11" and
+    "3.12" variants both survive).
+    """
+    padded = f" {key} "
+    for seen_key, seen in zip(seen_keys, seen_words):
+        if key == seen_key or padded in f" {seen_key} ":
+            return True
+        if len(words) >= 6 and len(words & seen) / len(words | seen) >= threshold:
+            if not any(c.isdigit() for word in words ^ seen for c in word):
+                return True
+    return False
+
+
+def dedupe_sentences(blocks: List[Block], threshold: float = DUPLICATE_SIMILARITY) -> List[List[str]]:
+    """Sentences of each block, without repeats of sentences kept earlier (higher-ranked blocks first)."""
+    seen_keys: List[str] = []
+    seen_words: List[Set[str]] = []
+    result = []
+    for block in blocks:
+        kept = []
+        for sentence in SENTENCE_RE.split(block.text):
+            sentence = sentence.strip()
+            tokens = WORD_RE.findall(sentence.casefold())
+            if not tokens:
+                continue
+            key, words = " ".join(tokens), set(tokens)
+            if _is_repeat(key, words, seen_keys, seen_words, threshold):
+                continue
+            seen_keys.append(key)
+            seen_words.append(words)
+            kept.append(sentence)
+        result.append(kept)
+    return result
+
+
+def pack(blocks: List[Block], budget: int = CONTEXT_TOKEN_BUDGET) -> List[Block]:
+    """
+    Merge, de-duplicate and cut `blocks` (best rank first) to `budget`
+    tokens. A block that does not fit whole is cut at a sentence boundary.
+    """
+    merged = merge_blocks(blocks)
+    packed: List[Block] = []
+    used = 0
+    for block, sentences in zip(merged, dedupe_sentences(merged)):
+        kept = []
+        for sentence in sentences:
+            tokens = count_tokens(sentence) + 1
+            if used + tokens > budget:
+                break
+            kept.append(sentence)
+            used += tokens
+        if kept:
+            packed.append(Block(" ".join(kept), block.source, block.rank, block.position, block.ids))
+        if used >= budget or len(kept) < len(sentences):
+            break
+    return packed
+
+
+def pack_nodes(nodes: Sequence[Any], budget: int = CONTEXT_TOKEN_BUDGET) -> List[Any]:
+    """`pack` for LlamaIndex `NodeWithScore`s in rank order; returns new nodes, one per packed block."""
+    from llama_index.core.schema import NodeWithScore, TextNode
+
+    blocks = []
+    for rank, n in enumerate(nodes):
+        metadata = n.node.metadata or {}
+        blocks.append(Block(n.node.get_content(), metadata.get("source_file"), rank,
+                            metadata.get("chunk_index"), [n.node.node_id]))
+    packed = []
+    for block in pack(blocks, budget):
+        best = nodes[block.rank]
+        node = TextNode(text=block.text, metadata={"source_file": block.source, "node_ids": block.ids},
+                        excluded_llm_metadata_keys=["node_ids"])
+        packed.append(NodeWithScore(node=node, score=best.score))
+    return packed
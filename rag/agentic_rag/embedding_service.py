@@ -0,0 +1,311 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+from rag.observability.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+# `openai` (default) calls the API; `onnx` runs a sentence-transformers model
+# on the CPU with ONNX Runtime.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+DEFAULT_MODELS = {
+    "openai": "text-embedding-3-small",
+    "onnx": "sentence-transformers/all-MiniLM-L6-v2",
+}
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", DEFAULT_MODELS.get(EMBEDDING_BACKEND, ""))
+KNOWN_DIMS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+}
+
+EMBED_BATCH_SIZE = histogram(
+    "rag_embedding_batch_texts",
+    "Texts embedded per backend call, after batching concurrent requests.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+EMBED_QUEUE_WAIT = histogram(
+    "rag_embedding_queue_wait_seconds",
+    "Time an embedding request waited for its batch to start.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+EMBED_INFERENCE = histogram(
+    "rag_embedding_inference_seconds",
+    "Latency of one batched embedding call, by backend.",
+    ["backend"],
+)
+
+
+@functools.lru_cache(maxsize=None)
+def embedding_dim() -> int:
+    """
+    Vector size of the configured model, which the tables and the vector
+    store are created with: EMBEDDING_DIM if set (OpenAI `text-embedding-3`
+    models are then shortened to it), else the model's known or configured size.
+    """
+    if os.getenv("EMBEDDING_DIM"):
+        return int(os.environ["EMBEDDING_DIM"])
+    if EMBEDDING_MODEL in KNOWN_DIMS:
+        return KNOWN_DIMS[EMBEDDING_MODEL]
+    from transformers import AutoConfig
+
+    return AutoConfig.from_pretrained(EMBEDDING_MODEL).hidden_size
+
+
+# ----------------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------------
+
+POOLING_MODES = {"pooling_mode_cls_token": "cls", "pooling_mode_mean_tokens": "mean"}
+
+
+def pooling_mode(model_name: str) -> str:
+    """
+    `cls` or `mean`, from the model's sentence-transformers pooling config
+    (`1_Pooling/config.json`, in a local directory or the Hub repo); `mean`
+    for models without one. BGE models, for one, are trained with CLS pooling.
+    """
+    path = os.path.join(model_name, "1_Pooling", "config.json")
+    if not os.path.isdir(model_name):
+        from huggingface_hub import hf_hub_download
+        from huggingface_hub.utils import EntryNotFoundError
+
+        try:
+            path = hf_hub_download(model_name, "1_Pooling/config.json")
+        except EntryNotFoundError:
+            path = None
+    if path is None or not os.path.exists(path):
+        logger.warning(f"{model_name} has no sentence-transformers pooling config; using mean pooling.")
+        return "mean"
+    with open(path) as f:
+        config = json.load(f)
+    enabled = sorted(key for key, value in config.items() if key.startswith("pooling_mode_") and value is True)
+    if len(enabled) != 1 or enabled[0] not in POOLING_MODES:
+        raise ValueError(f"{model_name} uses pooling {enabled}; the ONNX embedding backend supports "
+                         f"exactly one of {sorted(POOLING_MODES)}.")
+    return POOLING_MODES[enabled[0]]
+
+
+class OpenAIBackend:
+    """The OpenAI embeddings API, through the shared (cached, rate-limited) client."""
+
+    name = "openai"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, dim: Optional[int] = None):
+        self.model_name = model_name
+        self.dim = dim or embedding_dim()
+        self._dimensions = self.dim if self.dim != KNOWN_DIMS.get(model_name, self.dim) else None
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        from rag.agentic_rag.llm_clients import openai_client
+
+        kwargs = {"dimensions": self._dimensions} if self._dimensions else {}
+        response = openai_client().embeddings.create(input=texts, model=self.model_name, **kwargs)
+        return [d.embedding for d in response.data]
+
+
+class OnnxBackend:
+    """
+    A sentence-transformers model exported to ONNX Runtime (cached like the
+    reranker's export), pooled as the model's pooling config says (CLS or
+    mean) and L2-normalised. The session is
+    shared between threads; each thread gets its own tokenizer, since the
+    fast tokenizers reject concurrent use.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, cache_dir: Optional[str] = None,
+                 quantize: bool = False, max_length: int = 256):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+
+        from rag.agentic_rag.rerank_service import export_onnx
+
+        self.model_name = model_name
+        self.export_dir, model_dir, file_name = export_onnx(
+            ORTModelForFeatureExtraction, model_name,
+            cache_dir or os.getenv("EMBEDDING_ONNX_DIR") or os.getenv("RERANKER_ONNX_DIR"), quantize)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=file_name)
+        self.dim = self.model.config.hidden_size
+        self.pooling = pooling_mode(model_name)
+        self.max_length = max_length
+        self._local = threading.local()
+
+    def _tokenizer(self):
+        if not hasattr(self._local, "tokenizer"):
+            from transformers import AutoTokenizer
+
+            self._local.tokenizer = AutoTokenizer.from_pretrained(self.export_dir)
+        return self._local.tokenizer
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        inputs = self._tokenizer()(texts, padding=True, truncation=True, max_length=self.max_length,
+                                   return_tensors="np")
+        hidden = self.model(**inputs).last_hidden_state
+        if self.pooling == "cls":
+            pooled = hidden[:, 0].copy()
+        else:
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+
+def create_backend(name: Optional[str] = None):
+    """`EMBEDDING_BACKEND`: `openai` (default) or `onnx`; `EMBEDDING_INT8=1` quantises the ONNX model."""
+    name = name or EMBEDDING_BACKEND
+    if name == "onnx":
+        backend = OnnxBackend(quantize=os.getenv("EMBEDDING_INT8", "0") == "1")
+        if backend.dim != embedding_dim():
+            raise ValueError(f"{backend.model_name} returns {backend.dim} dimensions but the tables "
+                             f"use {embedding_dim()}; set EMBEDDING_DIM and run the migrations.")
+        return backend
+    if name == "openai":
+        return OpenAIBackend()
+    raise ValueError(f"Unknown embedding backend: {name}")
+
+
+# ----------------------------------------------------------------------------
+# Batching service
+# ----------------------------------------------------------------------------
+
+class _Request:
+    __slots__ = ("texts", "future", "context", "priority", "enqueued")
+
+    def __init__(self, texts: List[str], priority: str):
+        self.texts = texts
+        self.future: Future = Future()
+        # The caller's context: LLM priority and trace spans.
+        self.context = contextvars.copy_context()
+        self.priority = priority
+        self.enqueued = time.perf_counter()
+
+
+class BatchingEmbedder:
+    """
+    Cross-request batching in front of an embedding backend, for sync and
+    async callers alike.
+
+    A dispatcher thread collects requests until `max_batch_size` texts are
+    waiting or `max_wait_ms` has passed since the first one, and hands the
+    batch to a pool of `workers` threads, so batching continues while
+    earlier batches run. Inputs longer than `max_batch_size` are split.
+    Requests of different LLM priorities are never batched together, so
+    bulk texts are not admitted against the interactive budget; a batch
+    runs in the context of its first request.
+    """
+
+    def __init__(self, backend, max_batch_size: int = 64, max_wait_ms: float = 5.0, workers: int = 2):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Request that did not fit the previous batch; dispatcher thread only.
+        self._carry: Optional[_Request] = None
+
+    @classmethod
+    def from_env(cls, backend=None) -> "BatchingEmbedder":
+        return cls(
+            backend or create_backend(),
+            max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", "64")),
+            max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")),
+            workers=int(os.getenv("EMBEDDING_WORKERS", "2")),
+        )
+
+    @property
+    def dim(self) -> int:
+        return self.backend.dim
+
+    def _submit(self, texts: Sequence[str]) -> List[Future]:
+        with self._lock:
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch, name="embed-dispatch", daemon=True)
+                self._dispatcher.start()
+        from rag.agentic_rag.llm_limits import current_priority
+
+        priority = current_priority()
+        futures = []
+        for i in range(0, len(texts), self.max_batch_size):
+            request = _Request(list(texts[i:i + self.max_batch_size]), priority)
+            self._queue.put(request)
+            futures.append(request.future)
+        return futures
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return [vector for future in self._submit(texts) for vector in future.result()]
+
+    async def aembed(self, texts: Sequence[str]) -> List[List[float]]:
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in self._submit(texts)))
+        return [vector for result in results for vector in result]
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._carry or self._queue.get()]
+        self._carry = None
+        size = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(request.texts) > self.max_batch_size or request.priority != batch[0].priority:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _dispatch(self) -> None:
+        while True:
+            batch = self._collect()
+            self.executor.submit(batch[0].context.run, self._run, batch)
+
+    def _run(self, batch: List[_Request]) -> None:
+        started = time.perf_counter()
+        for request in batch:
+            EMBED_QUEUE_WAIT.observe(started - request.enqueued)
+        texts = [text for request in batch for text in request.texts]
+        EMBED_BATCH_SIZE.observe(len(texts))
+        try:
+            vectors = self.backend.embed(texts)
+        except Exception as exc:
+            for request in batch:
+                request.future.set_exception(exc)
+            return
+        EMBED_INFERENCE.observe(time.perf_counter() - started, backend=self.backend.name)
+        offset = 0
+        for request in batch:
+            count = len(request.texts)
+            request.future.set_result(vectors[offset:offset + count])
+            offset += count
+
+
+@functools.lru_cache(maxsize=None)
+def get_embedder() -> BatchingEmbedder:
+    """The process-wide embedder for the configured backend."""
+    return BatchingEmbedder.from_env()
+
+
+def embed_texts(texts: Sequence[str]) -> List[List[float]]:
+    return get_embedder().embed(texts)
@@ -0,0 +1,57 @@
+import os
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from rag.agentic_rag.embedding_service import (EMBEDDING_BACKEND, EMBEDDING_MODEL, KNOWN_DIMS,
+                                               BatchingEmbedder, embedding_dim, get_embedder)
+from rag.agentic_rag.llm_clients import llama_index_kwargs
+
+
+class BackendEmbedding(BaseEmbedding):
+    """LlamaIndex embedding model over a `BatchingEmbedder` (the local ONNX backend)."""
+
+    _embedder: BatchingEmbedder = PrivateAttr()
+
+    def __init__(self, embedder: BatchingEmbedder, **kwargs: Any):
+        super().__init__(model_name=EMBEDDING_MODEL, embed_batch_size=embedder.max_batch_size, **kwargs)
+        self._embedder = embedder
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BackendEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embedder.embed([query])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embedder.embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embedder.embed(texts)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return (await self._embedder.aembed([query]))[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._embedder.aembed([text]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._embedder.aembed(texts)
+
+
+def create_embed_model() -> BaseEmbedding:
+    """
+    The LlamaIndex embedding model for EMBEDDING_BACKEND. OpenAI keeps
+    LlamaIndex's own client (on the shared cached, rate-limited transport);
+    other backends go through the process-wide `BatchingEmbedder`.
+    """
+    if EMBEDDING_BACKEND == "openai":
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        dim = embedding_dim()
+        kwargs = {"dimensions": dim} if dim != KNOWN_DIMS.get(EMBEDDING_MODEL, dim) else {}
+        return OpenAIEmbedding(model=EMBEDDING_MODEL, api_key=os.getenv("OPENAI_API_KEY"),
+                               **kwargs, **llama_index_kwargs())
+    return BackendEmbedding(get_embedder())
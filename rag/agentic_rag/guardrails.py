@@ -0,0 +1,106 @@
+import asyncio
+import os
+import re
+import logging
+import time
+
+from rag.agentic_rag.instrumentation import STAGE_FALLBACKS, STAGE_LATENCY
+from rag.agentic_rag.llm_clients import langchain_kwargs
+from rag.agentic_rag.output_guard import MASK, OUTPUT_GUARD
+from rag.observability.tracing import span
+
+logger = logging.getLogger(__name__)
+
+EMAIL_RE = re.compile(r"(?<![a-zA-Z0-9_.+-])[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+
+# `local` runs the LLM rails only when an output-guard detector escalates;
+# `rails` runs them for every answer.
+OUTPUT_GUARD_MODE = os.getenv("OUTPUT_GUARD_MODE", "local")
+
+
+def mask_emails(text: str) -> str:
+    return EMAIL_RE.sub(MASK, text)
+
+
+def _rails_llm(config):
+    """The rails' main model on the shared OpenAI clients; `None` lets NeMo build its own."""
+    kwargs = langchain_kwargs(chat=False)
+    if not kwargs:
+        return None
+    from langchain_community.llms import OpenAI
+
+    main = next(m for m in config.models if m.type == "main")
+    return OpenAI(model_name=main.model, api_key=os.getenv("OPENAI_API_KEY"), **kwargs)
+
+
+def _build_rails():
+    from nemoguardrails import LLMRails, RailsConfig
+
+    config = RailsConfig.from_path("RailConfigPath")
+    rails = LLMRails(config, llm=_rails_llm(config))
+    rails.register_output_parser(mask_emails, name="mask_emails")
+    return rails
+
+
+async def load_rails():
+    """
+    Parse the rails config and build `LLMRails` off the event loop.
+    Returns `None` when nemoguardrails is missing or the config fails to load.
+    """
+    try:
+        import nemoguardrails  # noqa: F401
+    except Exception:
+        return None
+    try:
+        return await asyncio.to_thread(_build_rails)
+    except Exception as exc:
+        logger.warning(f"Guardrails setup failed: {exc!r}")
+        return None
+
+
+async def apply_guardrails(question: str, answer_text: str, rails=None, load=load_rails) -> str:
+    """
+    Mask e-mails, phone numbers and keys with the local output guard, and
+    run the NeMo output rails only for answers a detector escalates (or for
+    every answer with OUTPUT_GUARD_MODE=rails).
+    `rails` may be prebuilt with `load_rails()` so setup overlaps earlier work;
+    otherwise `load()` is awaited for them when an answer needs them.
+    """
+    start = time.perf_counter()
+    result = OUTPUT_GUARD.scan(answer_text)
+    if OUTPUT_GUARD_MODE != "rails" and not result.escalate:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="guardrails")
+        return result.text
+
+    logger.info(f"Output guard escalated to rails: {result.flagged}")
+    if rails is None:
+        rails = await load()
+    if rails is None:
+        STAGE_FALLBACKS.inc(stage="guardrails")
+        return result.text
+
+    from nemoguardrails.llm.types import Task
+
+    try:
+        with span("llm", stage="guardrails"):
+            guarded = await rails.generate_async(messages=[
+                {"role": "user", "content": question},
+                {"role": "assistant", "content": result.text},
+            ])
+
+        parsed = rails.runtime.llm_task_manager.parse_task_output(
+            task=Task.GENERATE_BOT_MESSAGE,
+            output=guarded["content"],
+            forced_output_parser="mask_emails"
+        )
+        # The rails may rephrase; mask whatever the model wrote as well.
+        text = OUTPUT_GUARD.scan(parsed.text).text
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="guardrails")
+        logger.info("Guardrails applied.")
+        logger.debug(f"Guardrails output {text}")
+        return text
+    except Exception as exc:
+        STAGE_FALLBACKS.inc(stage="guardrails")
+        logger.warning(f"Guardrails failed: {exc}")
+        # minimal fallback
+        return result.text
@@ -0,0 +1,31 @@
+from rag.observability.metrics import counter, histogram
+
+# Stages: retrieval, llm_rerank, flag_rerank, packing, synthesis, guardrails;
+# the `pipeline` fallback counts answers served by the agent instead. Agent
+# tool caches report under the tool name (vector_search, sql_query, web_search).
+STAGE_LATENCY = histogram(
+    "rag_stage_duration_seconds",
+    "Latency of each contextual answer stage.",
+    ["stage"],
+)
+STAGE_TOKENS = counter(
+    "rag_stage_tokens_total",
+    "Tokens sent to (prompt) and received from (completion) models per stage; "
+    "packing reports tokens removed from the context (saved).",
+    ["stage", "kind"],
+)
+STAGE_CACHE = counter(
+    "rag_stage_cache_total",
+    "Cache lookups per stage, by result (hit/miss).",
+    ["stage", "result"],
+)
+STAGE_FALLBACKS = counter(
+    "rag_stage_fallbacks_total",
+    "Stages that failed or were unavailable and fell back.",
+    ["stage"],
+)
+RERANK_DECISIONS = counter(
+    "rag_rerank_cascade_total",
+    "Rerank cascade decisions: whether the LLM reranker ran, and why.",
+    ["decision", "reason"],
+)
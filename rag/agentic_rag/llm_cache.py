@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import Column, Float, Integer, LargeBinary, MetaData, String, Table, Text, create_engine, make_url, select, text
+
+from rag.observability.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_REQUESTS = counter(
+    "rag_llm_cache_requests_total",
+    "OpenAI requests seen by the LLM cache, by endpoint and result (hit/miss/bypass/replay_miss).",
+    ["endpoint", "result"],
+)
+
+# off: no cache. cache: read-through, only deterministic requests.
+# record: always call OpenAI and store every response.
+# replay: answer from the cache only; a miss fails instead of calling out.
+MODES = ("off", "cache", "record", "replay")
+CACHED_ENDPOINTS = ("/chat/completions", "/completions", "/embeddings")
+# Request fields that do not change the response.
+IGNORED_FIELDS = ("user",)
+# Response headers kept with the body; the rest describe the original transfer.
+KEPT_HEADERS = ("content-type", "content-encoding")
+CACHE_HEADER = "x-llm-cache"
+
+EVICT_SQL = text("""
+    DELETE FROM llm_cache WHERE key IN (
+        SELECT key FROM (
+            SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM llm_cache
+        ) ranked WHERE running > :max_bytes
+    )
+""")
+
+
+class LLMCacheStore:
+    """
+    Cached responses in a SQL table: a SQLite file on local disk or the app's
+    Postgres. Least recently used entries are evicted once the stored bodies
+    exceed `max_bytes`; eviction runs every `evict_every` writes. Both
+    databases handle concurrent workers.
+    """
+
+    def __init__(self, url: str, max_bytes: int, evict_every: int = 100):
+        parsed = make_url(url)
+        connect_args = {}
+        if parsed.get_backend_name() == "sqlite":
+            if parsed.database:
+                Path(parsed.database).parent.mkdir(parents=True, exist_ok=True)
+            connect_args = {"timeout": 30}
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._writes = 0
+        metadata = MetaData()
+        self.table = Table(
+            "llm_cache", metadata,
+            Column("key", String(64), primary_key=True),
+            Column("status", Integer, nullable=False),
+            Column("headers", Text, nullable=False),
+            Column("body", LargeBinary, nullable=False),
+            Column("size", Integer, nullable=False),
+            Column("last_used", Float, nullable=False, index=True),
+        )
+        metadata.create_all(self.engine)
+
+    def _insert(self):
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(self.table)
+
+    def get(self, key: str) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        t = self.table
+        with self.engine.begin() as conn:
+            row = conn.execute(select(t.c.status, t.c.headers, t.c.body).where(t.c.key == key)).first()
+            if row is None:
+                return None
+            conn.execute(t.update().where(t.c.key == key).values(last_used=time.time()))
+        return row.status, json.loads(row.headers), row.body
+
+    def put(self, key: str, status: int, headers: Dict[str, str], body: bytes) -> None:
+        values = {"status": status, "headers": json.dumps(headers), "body": body, "size": len(body),
+                  "last_used": time.time()}
+        stmt = self._insert().values(key=key, **values)
+        with self.engine.begin() as conn:
+            conn.execute(stmt.on_conflict_do_update(index_elements=["key"], set_=values))
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                conn.execute(EVICT_SQL, {"max_bytes": self.max_bytes})
+
+
+def _endpoint(request: httpx.Request) -> Optional[str]:
+    path = request.url.path
+    return next((e for e in CACHED_ENDPOINTS if path.endswith(e)), None)
+
+
+class LLMCache:
+    """
+    Cache of OpenAI HTTP responses keyed by endpoint and request body, which
+    holds the model, messages/input and all parameters. It sits in the
+    httpx transport, so LlamaIndex, LangChain and NeMo clients share it
+    (see `llm_clients`). Streamed responses are stored as the raw event
+    stream and replayed as such.
+
+    In `cache` mode only deterministic requests are cached: embeddings and
+    completions with `temperature <= max_temperature`. `record` and
+    `replay` take every request, so a recorded run replays fully offline.
+    """
+
+    # NeMo runs its generation tasks at temperature 0.001.
+    def __init__(self, store: LLMCacheStore, mode: str = "cache", max_temperature: float = 0.01):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode}")
+        self.store = store
+        self.mode = mode
+        self.max_temperature = max_temperature
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMCache"]:
+        mode = os.getenv("LLM_CACHE_MODE", "off")
+        if mode == "off":
+            return None
+        store = LLMCacheStore(
+            os.getenv("LLM_CACHE_URL", "sqlite:///.llm_cache/llm_cache.db"),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024),
+        )
+        return cls(store, mode, float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.01")))
+
+    def key(self, request: httpx.Request) -> Optional[str]:
+        """Cache key of `request`, or `None` if it must go to OpenAI uncached."""
+        endpoint = _endpoint(request)
+        if endpoint is None or request.method != "POST":
+            return None
+        try:
+            body = json.loads(request.content or b"{}")
+        except ValueError:
+            return None
+        if self.mode == "cache" and endpoint != "/embeddings":
+            temperature = body.get("temperature")
+            # OpenAI samples at temperature 1 when none is sent.
+            if temperature is None or temperature > self.max_temperature:
+                return None
+        for field in IGNORED_FIELDS:
+            body.pop(field, None)
+        canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(f"{endpoint}\n{canonical}".encode()).hexdigest()
+
+    def lookup(self, request: httpx.Request, key: str) -> Optional[httpx.Response]:
+        if self.mode == "record":
+            LLM_CACHE_REQUESTS.inc(endpoint=_endpoint(request), result="miss")
+            return None
+        endpoint = _endpoint(request)
+        try:
+            entry = self.store.get(key)
+        except Exception as exc:
+            logger.warning(f"LLM cache lookup failed: {exc!r}")
+            entry = None
+        if entry is None:
+            if self.mode == "replay":
+                LLM_CACHE_REQUESTS.inc(endpoint=endpoint, result="replay_miss")
+                return _replay_miss(request, key)
+            LLM_CACHE_REQUESTS.inc(endpoint=endpoint, result="miss")
+            return None
+        LLM_CACHE_REQUESTS.inc(endpoint=endpoint, result="hit")
+        status, headers, body = entry
+        return httpx.Response(status, headers={**headers, CACHE_HEADER: "hit"}, content=body, request=request)
+
+    def storer(self, request: httpx.Request, response: httpx.Response, key: str) -> Optional[Callable[[bytes], None]]:
+        """Callback storing the full body of `response`, or `None` if it is not cacheable."""
+        if response.status_code != 200:
+            return None
+        headers = {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS}
+
+        def store(body: bytes) -> None:
+            try:
+                self.store.put(key, response.status_code, headers, body)
+            except Exception as exc:
+                logger.warning(f"Storing LLM response failed: {exc!r}")
+        return store
+
+
+def _replay_miss(request: httpx.Request, key: str) -> httpx.Response:
+    # A 404 is not retried by the OpenAI client, so offline runs fail fast.
+    error = {"error": {"message": f"No recorded response for this request (LLM cache key {key}).",
+                       "type": "llm_cache_miss", "code": "llm_cache_miss"}}
+    return httpx.Response(404, json=error, request=request)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Passes the raw body through and stores it once fully read."""
+
+    def __init__(self, stream: httpx.SyncByteStream, on_complete: Callable[[bytes], None]):
+        self._stream = stream
+        self._on_complete = on_complete
+
+    def __iter__(self):
+        chunks: List[bytes] = []
+        for chunk in self._stream:
+            chunks.append(chunk)
+            yield chunk
+        self._on_complete(b"".join(chunks))
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, on_complete: Callable[[bytes], None]):
+        self._stream = stream
+        self._on_complete = on_complete
+
+    async def __aiter__(self):
+        chunks: List[bytes] = []
+        async for chunk in self._stream:
+            chunks.append(chunk)
+            yield chunk
+        await asyncio.to_thread(self._on_complete, b"".join(chunks))
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+
+
+class CachingTransport(httpx.BaseTransport):
+    def __init__(self, cache: LLMCache, transport: httpx.BaseTransport):
+        self.cache = cache
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = self.cache.key(request)
+        if key is None:
+            if _endpoint(request):
+                LLM_CACHE_REQUESTS.inc(endpoint=_endpoint(request), result="bypass")
+            return self.transport.handle_request(request)
+        cached = self.cache.lookup(request, key)
+        if cached is not None:
+            return cached
+        response = self.transport.handle_request(request)
+        store = self.cache.storer(request, response, key)
+        if store is None:
+            return response
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_RecordingStream(response.stream, store), extensions=response.extensions)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncCachingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cache: LLMCache, transport: httpx.AsyncBaseTransport):
+        self.cache = cache
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = self.cache.key(request)
+        if key is None:
+            if _endpoint(request):
+                LLM_CACHE_REQUESTS.inc(endpoint=_endpoint(request), result="bypass")
+            return await self.transport.handle_async_request(request)
+        cached = await asyncio.to_thread(self.cache.lookup, request, key)
+        if cached is not None:
+            return cached
+        response = await self.transport.handle_async_request(request)
+        store = self.cache.storer(request, response, key)
+        if store is None:
+            return response
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_AsyncRecordingStream(response.stream, store), extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+LLM_CACHE = LLMCache.from_env()
@@ -0,0 +1,75 @@
+import functools
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+from rag.agentic_rag.llm_cache import LLM_CACHE, AsyncCachingTransport, CachingTransport
+from rag.agentic_rag.llm_limits import LLM_LIMITER, AsyncRateLimitedTransport, RateLimitedTransport
+
+# The OpenAI SDK's own pool limits; a custom transport has to set them itself.
+CONNECTION_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+
+
+def _enabled() -> bool:
+    return LLM_CACHE is not None or LLM_LIMITER is not None
+
+
+# Cache hits are answered before the rate limiter, so they cost no quota.
+@functools.lru_cache(maxsize=None)
+def http_client() -> Optional[httpx.Client]:
+    """Shared httpx client for OpenAI calls, or `None` with cache and limiter off (SDK default)."""
+    if not _enabled():
+        return None
+    import openai
+    transport: httpx.BaseTransport = httpx.HTTPTransport(limits=CONNECTION_LIMITS)
+    if LLM_LIMITER is not None:
+        transport = RateLimitedTransport(LLM_LIMITER, transport)
+    if LLM_CACHE is not None:
+        transport = CachingTransport(LLM_CACHE, transport)
+    return openai.DefaultHttpxClient(transport=transport)
+
+
+@functools.lru_cache(maxsize=None)
+def async_http_client() -> Optional[httpx.AsyncClient]:
+    if not _enabled():
+        return None
+    import openai
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(limits=CONNECTION_LIMITS)
+    if LLM_LIMITER is not None:
+        transport = AsyncRateLimitedTransport(LLM_LIMITER, transport)
+    if LLM_CACHE is not None:
+        transport = AsyncCachingTransport(LLM_CACHE, transport)
+    return openai.DefaultAsyncHttpxClient(transport=transport)
+
+
+@functools.lru_cache(maxsize=None)
+def openai_client():
+    """`openai.OpenAI` on the shared client, for code calling the SDK directly."""
+    import openai
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client())
+
+
+def llama_index_kwargs() -> Dict[str, Any]:
+    """Client arguments for LlamaIndex `OpenAI` / `OpenAIEmbedding`."""
+    if not _enabled():
+        return {}
+    return {"http_client": http_client(), "async_http_client": async_http_client()}
+
+
+def langchain_kwargs(chat: bool = True) -> Dict[str, Any]:
+    """
+    Client arguments for the langchain_community `ChatOpenAI` (`chat`) and
+    `OpenAI` models. Their own `http_client` field is handed to the async
+    SDK client too, which rejects a sync client, so the SDK clients are
+    built here.
+    """
+    if not _enabled():
+        return {}
+    import openai
+    api_key = os.getenv("OPENAI_API_KEY")
+    sync_client = openai_client()
+    async_client = openai.AsyncOpenAI(api_key=api_key, http_client=async_http_client())
+    if chat:
+        return {"client": sync_client.chat.completions, "async_client": async_client.chat.completions}
+    return {"client": sync_client.completions, "async_client": async_client.completions}
@@ -0,0 +1,321 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+import httpx
+
+from rag.agentic_rag.tokens import count_tokens
+from rag.observability.metrics import counter, histogram
+
+try:
+    import fcntl
+except ImportError:  # Windows: the budget is then per process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LIMITER_REQUESTS = counter(
+    "rag_llm_limiter_requests_total",
+    "OpenAI requests through the rate limiter, by priority and whether they had to wait.",
+    ["priority", "outcome"],
+)
+LIMITER_WAIT = histogram(
+    "rag_llm_limiter_wait_seconds",
+    "Time OpenAI requests waited for rate-limit budget and a free slot.",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+LIMITER_TOKENS = counter(
+    "rag_llm_limiter_tokens_total",
+    "Estimated tokens (prompt plus max completion) admitted by the rate limiter, by priority.",
+    ["priority"],
+)
+UPSTREAM_RATE_LIMITED = counter(
+    "rag_llm_upstream_rate_limited_total",
+    "429 responses from OpenAI; each pauses all workers for the advertised reset time.",
+    ["endpoint"],
+)
+
+# `interactive` (queries) may use the whole budget; `bulk` (ingestion) stops
+# at the reserve, which is left to interactive calls.
+PRIORITIES = ("interactive", "bulk")
+LIMITED_ENDPOINTS = ("/chat/completions", "/completions", "/embeddings")
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default="interactive")
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextlib.contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Run the OpenAI calls made in this block (and tasks started from it) at `priority`."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {priority}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class SharedTokenBucket:
+    """
+    Request and token buckets kept in a small file, locked with `flock`, so
+    every worker process on the host draws from the same budget.
+
+    Each bucket refills at its per-minute rate up to `burst_s` seconds of
+    quota. `block(seconds)` stops all admissions, used when OpenAI answers
+    429 anyway (other hosts or clients share the key).
+
+    The file is opened on first use in each process: `flock` locks belong
+    to the open file, so a descriptor inherited across a pre-fork would
+    not keep the workers apart. Both methods block; async callers run them
+    in a thread.
+    """
+
+    STATE = struct.Struct("4d")  # requests, tokens, updated_at, blocked_until
+
+    def __init__(self, path: str, rpm: float, tpm: float, burst_s: float = 10.0, bulk_reserve: float = 0.2):
+        self.path = path
+        self.request_rate = rpm / 60.0
+        self.token_rate = tpm / 60.0
+        self.request_capacity = max(1.0, self.request_rate * burst_s)
+        self.token_capacity = max(1.0, self.token_rate * burst_s)
+        self.bulk_reserve = bulk_reserve
+        self._thread_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._file = None
+        self._pid: Optional[int] = None
+        if hasattr(os, "register_at_fork"):
+            # A lock held by a parent thread at fork time would stay held in the child.
+            os.register_at_fork(after_in_child=self._reset_locks)
+
+    def _reset_locks(self) -> None:
+        self._open_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+
+    def _ensure_open(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._open_lock:
+            if self._pid == pid:
+                return
+            # First use, or a forked child: the inherited descriptor is the parent's.
+            if self._file is not None:
+                self._file.close()
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._file = os.fdopen(fd, "r+b", buffering=0)
+            self._pid = pid
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[list]:
+        self._ensure_open()
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._file.seek(0)
+                data = self._file.read(self.STATE.size)
+                now = time.time()
+                if len(data) == self.STATE.size:
+                    state = list(self.STATE.unpack(data))
+                else:
+                    state = [self.request_capacity, self.token_capacity, now, 0.0]
+                elapsed = max(0.0, now - state[2])
+                state[0] = min(self.request_capacity, state[0] + elapsed * self.request_rate)
+                state[1] = min(self.token_capacity, state[1] + elapsed * self.token_rate)
+                state[2] = now
+                yield state
+                self._file.seek(0)
+                self._file.write(self.STATE.pack(*state))
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def try_acquire(self, tokens: int, priority: str = "interactive") -> float:
+        """Take one request and `tokens`; returns 0 on success, else seconds to wait before retrying."""
+        tokens = min(tokens, self.token_capacity * (1 - self.bulk_reserve))
+        reserve = self.bulk_reserve if priority == "bulk" else 0.0
+        with self._locked() as state:
+            now = state[2]
+            if state[3] > now:
+                return state[3] - now
+            need_requests = 1 + reserve * self.request_capacity
+            need_tokens = tokens + reserve * self.token_capacity
+            if state[0] >= need_requests and state[1] >= need_tokens:
+                state[0] -= 1
+                state[1] -= tokens
+                return 0.0
+            return max((need_requests - state[0]) / self.request_rate,
+                       (need_tokens - state[1]) / self.token_rate)
+
+    def block(self, seconds: float) -> None:
+        with self._locked() as state:
+            state[3] = max(state[3], state[2] + seconds)
+
+
+def estimate_tokens(request: httpx.Request, completion_estimate: int) -> int:
+    """What OpenAI counts against TPM: prompt tokens plus `max_tokens` (or `completion_estimate`)."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return completion_estimate
+    model = body.get("model") or "gpt-3.5-turbo"
+    texts = []
+    if "messages" in body:
+        for message in body["messages"]:
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            texts.append(content)
+        # Per-message formatting overhead.
+        prompt = sum(count_tokens(t, model) for t in texts) + 4 * len(texts)
+    else:
+        inputs = body.get("input", body.get("prompt", ""))
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        prompt = sum(len(i) if isinstance(i, list) else count_tokens(str(i), model) for i in inputs)
+    if request.url.path.endswith("/embeddings"):
+        return prompt
+    completion = body.get("max_tokens") or body.get("max_completion_tokens") or completion_estimate
+    return prompt + completion * body.get("n", 1)
+
+
+def _reset_seconds(response: httpx.Response, default: float) -> float:
+    """Seconds until OpenAI accepts requests again, from `retry-after`."""
+    retry_after = response.headers.get("retry-after")
+    if retry_after is None:
+        return default
+    try:
+        return float(retry_after)
+    except ValueError:
+        return default
+
+
+class LLMRateLimiter:
+    """
+    Admission control for OpenAI requests: the shared token bucket, then at
+    most `max_inflight` requests in flight per process (sync and async
+    callers each).
+    """
+
+    def __init__(self, bucket: SharedTokenBucket, max_inflight: int = 32, completion_estimate: int = 256,
+                 pause_s: float = 2.0):
+        self.bucket = bucket
+        self.max_inflight = max_inflight
+        self.completion_estimate = completion_estimate
+        self.pause_s = pause_s
+        self._sync_slots = threading.BoundedSemaphore(max_inflight)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMRateLimiter"]:
+        if os.getenv("LLM_RATE_LIMIT", "1") != "1":
+            return None
+        bucket = SharedTokenBucket(
+            os.getenv("LLM_RATE_STATE_FILE", os.path.join(tempfile.gettempdir(), "rag_llm_rate_limit")),
+            rpm=float(os.getenv("LLM_RATE_RPM", "3000")),
+            tpm=float(os.getenv("LLM_RATE_TPM", "1000000")),
+            burst_s=float(os.getenv("LLM_RATE_BURST_S", "10")),
+            bulk_reserve=float(os.getenv("LLM_RATE_BULK_RESERVE", "0.2")),
+        )
+        return cls(bucket, max_inflight=int(os.getenv("LLM_MAX_INFLIGHT", "32")),
+                   completion_estimate=int(os.getenv("LLM_RATE_COMPLETION_ESTIMATE", "256")))
+
+    def _admit(self, request: httpx.Request) -> Tuple[str, int]:
+        priority = current_priority()
+        return priority, estimate_tokens(request, self.completion_estimate)
+
+    def _record(self, priority: str, tokens: int, waited: float) -> None:
+        LIMITER_REQUESTS.inc(priority=priority, outcome="delayed" if waited > 0.001 else "immediate")
+        LIMITER_TOKENS.inc(tokens, priority=priority)
+        LIMITER_WAIT.observe(waited, priority=priority)
+
+    @contextlib.contextmanager
+    def slot(self, request: httpx.Request) -> Iterator[None]:
+        priority, tokens = self._admit(request)
+        start = time.perf_counter()
+        while True:
+            wait = self.bucket.try_acquire(tokens, priority)
+            if wait <= 0:
+                break
+            time.sleep(min(wait, 1.0))
+        with self._sync_slots:
+            self._record(priority, tokens, time.perf_counter() - start)
+            yield
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self, request: httpx.Request):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_inflight)
+        priority, tokens = self._admit(request)
+        start = time.perf_counter()
+        while True:
+            # flock and the state file I/O block; keep them off the event loop.
+            wait = await asyncio.to_thread(self.bucket.try_acquire, tokens, priority)
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, 1.0))
+        async with self._async_slots:
+            self._record(priority, tokens, time.perf_counter() - start)
+            yield
+
+    def observe(self, request: httpx.Request, response: httpx.Response) -> None:
+        if response.status_code == 429:
+            endpoint = next(e for e in LIMITED_ENDPOINTS if request.url.path.endswith(e))
+            UPSTREAM_RATE_LIMITED.inc(endpoint=endpoint)
+            seconds = _reset_seconds(response, self.pause_s)
+            logger.warning(f"OpenAI rate limit hit on {endpoint}; pausing all workers for {seconds:g}s.")
+            self.bucket.block(seconds)
+
+
+def _limited(request: httpx.Request) -> bool:
+    return request.method == "POST" and request.url.path.endswith(LIMITED_ENDPOINTS)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    def __init__(self, limiter: LLMRateLimiter, transport: httpx.BaseTransport):
+        self.limiter = limiter
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not _limited(request):
+            return self.transport.handle_request(request)
+        with self.limiter.slot(request):
+            response = self.transport.handle_request(request)
+        self.limiter.observe(request, response)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, limiter: LLMRateLimiter, transport: httpx.AsyncBaseTransport):
+        self.limiter = limiter
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not _limited(request):
+            return await self.transport.handle_async_request(request)
+        async with self.limiter.async_slot(request):
+            response = await self.transport.handle_async_request(request)
+        if response.status_code == 429:
+            await asyncio.to_thread(self.limiter.observe, request, response)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+LLM_LIMITER = LLMRateLimiter.from_env()
@@ -1,19 +1,36 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, AsyncIterator, List, Optional, Tuple
 from rag.agentic_rag.db import get_db, get_vector_store_index
 from rag.agentic_rag.model_document import LiDocument, LiDocumentInDB, LiDocumentSummary
 from rag.agentic_rag.agent import get_contextual_answer as get_answer
-from llama_index.embeddings.openai import OpenAIEmbedding
 from rag.agentic_rag.services import ingest_pdf_to_li
-from rag.agentic_rag.agent import get_agent_instance
+from rag.observability.metrics import CONTENT_TYPE_LATEST, INGESTED_CHUNKS, MetricsMiddleware, render_latest
+from rag.observability.tracing import TRACE_STORE, TracingMiddleware
+from rag.agentic_rag.agent import run_agent, stream_agent_answer, stream_contextual_answer
+from rag.agentic_rag.embeddings import create_embed_model
+from rag.agentic_rag.registry import PIPELINE
+from rag.agentic_rag.tool_cache import invalidate_documents
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import json
 import os
 import logging
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build models and clients once, in the background; /ready reports progress.
+    PIPELINE.start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, app_name="agentic_rag")
+app.add_middleware(TracingMiddleware, app_name="agentic_rag")
 
 logging.basicConfig(
     level=logging.INFO,  # or DEBUG, WARNING, ERROR
@@ -25,6 +42,8 @@ load_dotenv()
 class QueryRequest(BaseModel):
     """Schema for the query endpoint."""
     question: str
+    # Conversation to continue on /query; omit for a stateless question.
+    session_id: Optional[str] = None
 
 @app.post("/upload_pdf", response_model=List[str])
 async def upload_pdf(file: UploadFile = File(...),db: Session = Depends(get_db)) -> List[int]:
@@ -32,8 +51,13 @@ async def upload_pdf(file: UploadFile = File(...),db: Session = Depends(get_db))
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     try:
-        embeddings = OpenAIEmbedding(model="text-embedding-3-small", api_key=os.getenv("OPENAI_API_KEY"))
-        ids = ingest_pdf_to_li(file, embeddings, db)
+        pipeline = await PIPELINE.ready()
+        embeddings = pipeline.embed_model or create_embed_model()
+        # Bulk embedding waits for rate-limit budget with blocking sleeps; keep it off the loop.
+        ids = await run_in_threadpool(ingest_pdf_to_li, file, embeddings, db)
+        INGESTED_CHUNKS.inc(len(ids), app="agentic_rag")
+        # New chunks change what the vector and SQL tools would return, in every worker.
+        invalidate_documents()
         return ids
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
@@ -63,14 +87,14 @@ def delete_document(node_id: str, db: Session = Depends(get_db)) -> JSONResponse
         raise HTTPException(status_code=404, detail="Document not found")
     db.delete(doc)
     db.commit()
+    invalidate_documents()
     return JSONResponse(content={"detail": "Deleted"})
 
 
 @app.post("/query")
 async def query_agent(request: QueryRequest, db: Session = Depends(get_db)) -> JSONResponse:
     """Query via agent (vector/sql/web)."""
-    agent = get_agent_instance(db)
-    answer = agent.run(request.question)
+    answer = await run_agent(request.question, db, request.session_id)
     return JSONResponse(content={"answer": answer})
 
 
@@ -80,6 +104,49 @@ async def get_contextual_answer(request: QueryRequest, db: Session = Depends(get
     return JSONResponse(content={"answer": answer})
 
 
+async def _sse(events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """Serialise `(event, data)` pairs as server-sent events."""
+    try:
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    except Exception as exc:
+        logging.getLogger(__name__).warning(f"Streaming failed: {exc}")
+        yield f"event: error\ndata: {json.dumps({'detail': str(exc)})}\n\n"
+
+
+def _sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    return StreamingResponse(
+        _sse(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/query/stream")
+async def query_agent_stream(request: QueryRequest, db: Session = Depends(get_db)) -> StreamingResponse:
+    """Query via agent, streaming tool calls and the final answer as SSE."""
+    return _sse_response(stream_agent_answer(request.question, db, request.session_id))
+
+
+@app.post("/get_contextual_answer/stream")
+async def get_contextual_answer_stream(request: QueryRequest, db: Session = Depends(get_db)) -> StreamingResponse:
+    """Stream retrieval results, rerank decisions and answer tokens as SSE."""
+    return _sse_response(stream_contextual_answer(request.question, db))
+
+
+@app.get("/ready")
+def ready() -> JSONResponse:
+    """Readiness probe: 503 until the pipeline registry has finished loading."""
+    status_code = 200 if PIPELINE.is_ready else 503
+    return JSONResponse(status_code=status_code, content=PIPELINE.describe())
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of HTTP and per-stage pipeline metrics."""
+    return PlainTextResponse(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 class DebugNode(BaseModel):
     id: str
     text_snippet: str
@@ -89,7 +156,7 @@ class DebugNode(BaseModel):
 def debug_query_vectorstore(question: str, db: Session = Depends(get_db)) -> List[DebugNode]:
     """Debug vector store retrieval via LlamaIndex."""
     try:
-        index = get_vector_store_index("li_document")
+        index = PIPELINE.index if PIPELINE.index is not None else get_vector_store_index("li_document")
         query_engine = index.as_query_engine(similarity_top_k=5, show_progress=True)
         response = query_engine.query(question)
 
@@ -111,6 +178,21 @@ def debug_query_vectorstore(question: str, db: Session = Depends(get_db)) -> Lis
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/debug/traces")
+def debug_list_traces(slow_only: bool = False, limit: int = 50) -> JSONResponse:
+    """Most recent request traces; `slow_only` keeps those with a captured profile."""
+    return JSONResponse(content=TRACE_STORE.recent(slow_only=slow_only, limit=limit))
+
+
+@app.get("/debug/traces/{trace_id}")
+def debug_get_trace(trace_id: str) -> JSONResponse:
+    """Span tree (and sampling profile for slow requests) of one request."""
+    trace = TRACE_STORE.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return JSONResponse(content=trace)
+
+
 if __name__ == "__main__":  # pragma: no cover
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
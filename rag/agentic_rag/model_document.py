@@ -7,13 +7,14 @@ from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 from rag.agentic_rag.db import Base  
+from rag.agentic_rag.embedding_service import embedding_dim
 
 
 class LiDocument(Base):
     __tablename__ = "li_document"
     node_id = Column(String, primary_key=True)    
     text    = Column(Text, nullable=False)
-    embedding = Column(Vector(1536), nullable=False)
+    embedding = Column(Vector(embedding_dim()), nullable=False)
     metadata_ = Column("metadata",JSONB)    
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from rag.observability.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+MASK = "[***]"
+
+GUARD_FINDINGS = counter(
+    "rag_output_guard_findings_total",
+    "Output guard detector hits, by detector and action (mask/escalate).",
+    ["detector", "action"],
+)
+
+
+class Detector:
+    """
+    One kind of content to find in answers.
+
+    `mask` detectors have their matches replaced with `replacement`;
+    `escalate` detectors leave the text alone and mark the answer as
+    needing the LLM rails.
+    """
+
+    def __init__(self, name: str, pattern: str, action: str = "mask", replacement: str = MASK,
+                 flags: int = 0):
+        if action not in ("mask", "escalate"):
+            raise ValueError(f"Unknown output guard action: {action}")
+        self.name = name
+        self.pattern = pattern
+        self.action = action
+        self.replacement = replacement
+        self.flags = flags
+
+    @classmethod
+    def keywords(cls, name: str, words: Sequence[str], action: str = "escalate") -> "Detector":
+        alternation = "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+        return cls(name, rf"\b(?:{alternation})\b", action, flags=re.IGNORECASE)
+
+
+# The e-mail pattern is the one `mask_emails` uses, so masking is identical.
+# Its lookbehind keeps a match from starting inside a run of local-part
+# characters, so a long run without an `@` is scanned once, not once per
+# position. The other patterns already start at a boundary or a fixed prefix.
+BUILTIN_DETECTORS = [
+    Detector("api_key", r"\b(?:sk-[A-Za-z0-9_-]{20,}|AKIA[0-9A-Z]{16}|gh[pousr]_[A-Za-z0-9]{36,}"
+                        r"|xox[abprs]-[A-Za-z0-9-]{10,})\b"),
+    Detector("email", r"(?<![a-zA-Z0-9_.+-])[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"),
+    Detector("phone", r"(?<![\w.])(?:\+\d{1,3}[\s.-]?)?(?:\(\d{2,4}\)|\d{2,4})[\s.-]\d{3,4}[\s.-]\d{3,4}(?![\w.])"),
+    Detector.keywords("sensitive_terms", ["password", "social security number", "credit card number", "ssn"]),
+]
+
+
+def load_detectors(path: Optional[str] = None) -> List[Detector]:
+    """
+    Built-in detectors plus the ones in OUTPUT_GUARD_CONFIG, a JSON list of
+    `{"name": ..., "pattern": ...}` or `{"name": ..., "keywords": [...]}`
+    objects with an optional `action` (`mask` or `escalate`).
+    """
+    detectors = list(BUILTIN_DETECTORS)
+    path = path or os.getenv("OUTPUT_GUARD_CONFIG")
+    if not path:
+        return detectors
+    with open(path) as f:
+        for spec in json.load(f):
+            if "keywords" in spec:
+                detectors.append(Detector.keywords(spec["name"], spec["keywords"], spec.get("action", "escalate")))
+            else:
+                detectors.append(Detector(spec["name"], spec["pattern"], spec.get("action", "mask"),
+                                          spec.get("replacement", MASK)))
+    return detectors
+
+
+class GuardResult:
+    def __init__(self, text: str, findings: List[Tuple[str, str]]):
+        self.text = text
+        # (detector, action) per match
+        self.findings = findings
+
+    @property
+    def escalate(self) -> bool:
+        return any(action == "escalate" for _, action in self.findings)
+
+    @property
+    def flagged(self) -> List[str]:
+        return sorted({name for name, action in self.findings if action == "escalate"})
+
+
+class OutputGuard:
+    """
+    All detectors compiled into a single alternation, so an answer is
+    scanned once, left to right, whatever the number of detectors. Where
+    two detectors could match at the same position the earlier one wins.
+    """
+
+    def __init__(self, detectors: Sequence[Detector]):
+        self.detectors = list(detectors)
+        parts = []
+        for i, d in enumerate(self.detectors):
+            pattern = f"(?i:{d.pattern})" if d.flags & re.IGNORECASE else d.pattern
+            parts.append(f"(?P<d{i}>{pattern})")
+        self.scanner = re.compile("|".join(parts))
+
+    def _replace(self, findings: List[Tuple[str, str]]):
+        def replace(match: "re.Match") -> str:
+            detector = self.detectors[int(match.lastgroup[1:])]
+            findings.append((detector.name, detector.action))
+            return detector.replacement if detector.action == "mask" else match.group(0)
+        return replace
+
+    def scan(self, text: str) -> GuardResult:
+        findings: List[Tuple[str, str]] = []
+        masked = self.scanner.sub(self._replace(findings), text)
+        for name, action in findings:
+            GUARD_FINDINGS.inc(detector=name, action=action)
+        return GuardResult(masked, findings)
+
+    def stream(self, max_window: int = 256, holdback: int = 64) -> "StreamingGuard":
+        return StreamingGuard(self, max_window, holdback)
+
+
+class StreamingGuard:
+    """
+    Incremental `OutputGuard.scan` for token streams.
+
+    The last `holdback` characters are kept back. The cut is then moved to
+    just after a whitespace character and before any match that reaches
+    into the held text, so neither matches nor word-boundary checks are
+    split and the concatenated output equals scanning the whole answer at
+    once. That holds as long as `holdback` is at least the longest match
+    that can contain whitespace (phone numbers, keyword phrases) and no
+    match is longer than `max_window`. `findings` accumulates over the
+    stream.
+    """
+
+    def __init__(self, guard: OutputGuard, max_window: int = 256, holdback: int = 64):
+        self.guard = guard
+        self.max_window = max_window
+        self.holdback = holdback
+        self.findings: List[Tuple[str, str]] = []
+        self._buffer = ""
+
+    def _cut(self) -> int:
+        buffer = self._buffer
+        cut = max(0, len(buffer) - self.holdback)
+        while True:
+            moved = cut
+            for match in self.guard.scanner.finditer(buffer):
+                if match.start() >= moved:
+                    break
+                if match.end() > moved:
+                    moved = match.start()
+                    break
+            while moved > 0 and not buffer[moved - 1].isspace():
+                moved -= 1
+            if moved == cut:
+                break
+            cut = moved
+        return max(cut, len(buffer) - self.max_window)
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        cut = self._cut()
+        ready, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self._scan(ready)
+
+    def flush(self) -> str:
+        ready, self._buffer = self._buffer, ""
+        return self._scan(ready)
+
+    def _scan(self, text: str) -> str:
+        if not text:
+            return ""
+        result = self.guard.scan(text)
+        self.findings.extend(result.findings)
+        return result.text
+
+    @property
+    def escalate(self) -> bool:
+        return GuardResult("", self.findings).escalate
+
+    @property
+    def flagged(self) -> List[str]:
+        return GuardResult("", self.findings).flagged
+
+
+OUTPUT_GUARD = OutputGuard(load_detectors())
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from rag.agentic_rag.db import get_vector_store_index
+from rag.agentic_rag.guardrails import load_rails
+from rag.agentic_rag.rerank_service import BatchingReranker, create_backend
+from rag.agentic_rag.router import EmbeddingRouter
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXT = "warm up"
+# Seconds before a failed rails load is tried again.
+RAILS_RETRY_S = float(os.getenv("RAILS_RETRY_S", "300"))
+
+
+class PipelineRegistry:
+    """
+    Heavy objects of the contextual answer pipeline, built once at startup.
+
+    `start()` schedules loading in the background (called from the app
+    lifespan); `ready()` awaits it and returns the registry. Components that
+    fail to load stay `None` and the pipeline falls back as before.
+
+    The LlamaIndex objects are stateless between calls and safe to share.
+    The cross-encoder is not (its fast tokenizer rejects concurrent use);
+    `reranker` batches requests and runs inference from a single worker.
+
+    The guardrails are the one component loaded again later: requests that
+    need them call `get_rails()`, which retries a failed load at most every
+    `RAILS_RETRY_S` seconds instead of re-parsing the config per request.
+    """
+
+    def __init__(self):
+        self.status = "loading"
+        self.errors: Dict[str, str] = {}
+        self.llamaindex_available = False
+        self.embed_model = None
+        self.index = None
+        self.llm = None
+        self.llm_reranker = None
+        self.synthesizer = None
+        self.streaming_synthesizer = None
+        self.reranker: Optional[BatchingReranker] = None
+        self.rails = None
+        self._rails_retry_at = 0.0
+        self._rails_lock: Optional[asyncio.Lock] = None
+        self.router: Optional[EmbeddingRouter] = None
+        self._load_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status != "loading"
+
+    def start(self) -> "asyncio.Task":
+        if self._load_task is None:
+            self._load_task = asyncio.create_task(self._load())
+        return self._load_task
+
+    async def ready(self) -> "PipelineRegistry":
+        await asyncio.shield(self.start())
+        return self
+
+    def describe(self) -> Dict[str, Any]:
+        components = {
+            "llamaindex": self.llamaindex_available,
+            "reranker": self.reranker.backend.name if self.reranker else None,
+            "guardrails": self.rails is not None,
+            "router": self.router is not None,
+        }
+        return {"status": self.status, "components": components, "errors": self.errors}
+
+    async def get_rails(self):
+        """The NeMo rails, or `None` while they failed to load and the retry interval runs."""
+        if self.rails is not None or time.monotonic() < self._rails_retry_at:
+            return self.rails
+        if self._rails_lock is None:
+            self._rails_lock = asyncio.Lock()
+        async with self._rails_lock:
+            # Concurrent callers wait for one load rather than starting their own.
+            if self.rails is None and time.monotonic() >= self._rails_retry_at:
+                self._set_rails(await load_rails())
+        return self.rails
+
+    def _set_rails(self, rails) -> None:
+        self.rails = rails
+        if rails is None:
+            self._rails_retry_at = time.monotonic() + RAILS_RETRY_S
+            self.errors["guardrails"] = "nemoguardrails unavailable or config failed to load"
+        else:
+            self.errors.pop("guardrails", None)
+        if self.is_ready:
+            self.status = "degraded" if self.errors else "ready"
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _build_llamaindex(self) -> None:
+        from llama_index.core.postprocessor.llm_rerank import LLMRerank
+        from llama_index.core.response_synthesizers import CompactAndRefine
+        from llama_index.llms.openai import OpenAI as LlamaOpenAI
+
+        from rag.agentic_rag.embeddings import create_embed_model
+        from rag.agentic_rag.llm_clients import llama_index_kwargs
+
+        self.embed_model = create_embed_model()
+        self.index = get_vector_store_index("li_document", embed_model=self.embed_model)
+        # Temperature 0 keeps rerank and synthesis deterministic, and cacheable.
+        self.llm = LlamaOpenAI(model="gpt-3.5-turbo", temperature=0, api_key=os.getenv("OPENAI_API_KEY"),
+                               **llama_index_kwargs())
+        self.llm_reranker = LLMRerank(choice_batch_size=5, top_n=3, llm=self.llm)
+        self.synthesizer = CompactAndRefine(llm=self.llm, verbose=False)
+        self.streaming_synthesizer = CompactAndRefine(llm=self.llm, streaming=True, verbose=False)
+        self.llamaindex_available = True
+
+    def _build_reranker(self) -> None:
+        reranker = BatchingReranker(
+            create_backend(),
+            max_batch_size=int(os.getenv("RERANK_MAX_BATCH", "32")),
+            max_wait_ms=float(os.getenv("RERANK_MAX_WAIT_MS", "5")),
+        )
+        reranker.warm_up()
+        self.reranker = reranker
+
+    async def _warm_up(self) -> None:
+        # One retrieval exercises the embedding client and the pgvector pool.
+        retriever = self.index.as_retriever(similarity_top_k=1)
+        await retriever.aretrieve(WARMUP_TEXT)
+        if os.getenv("RAG_WARMUP_LLM", "0") == "1":
+            await self.llm.acomplete(WARMUP_TEXT)
+
+    async def _load(self) -> None:
+        logger.info("Loading pipeline components.")
+        results = await asyncio.gather(
+            asyncio.to_thread(self._build_llamaindex),
+            asyncio.to_thread(self._build_reranker),
+            load_rails(),
+            return_exceptions=True,
+        )
+        for name, result in zip(("llamaindex", "reranker"), results[:2]):
+            if isinstance(result, BaseException):
+                self.errors[name] = repr(result)
+                logger.warning(f"Pipeline component {name} unavailable: {result!r}")
+
+        self._set_rails(None if isinstance(results[2], BaseException) else results[2])
+
+        if self.llamaindex_available and os.getenv("ROUTER_ENABLED", "1") == "1":
+            try:
+                self.router = await EmbeddingRouter.build(self.embed_model)
+            except Exception as exc:
+                self.errors["router"] = repr(exc)
+                logger.warning(f"Query router unavailable: {exc!r}")
+
+        if self.llamaindex_available:
+            try:
+                await self._warm_up()
+            except Exception as exc:
+                self.errors["warmup"] = repr(exc)
+                logger.warning(f"Pipeline warm-up failed: {exc!r}")
+
+        self.status = "degraded" if self.errors else "ready"
+        logger.info(f"Pipeline components loaded ({self.status}).")
+
+
+PIPELINE = PipelineRegistry()
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from rag.observability.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+
+RERANK_BATCH_SIZE = histogram(
+    "rag_rerank_batch_pairs",
+    "Pairs scored per cross-encoder inference.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+RERANK_QUEUE_WAIT = histogram(
+    "rag_rerank_queue_wait_seconds",
+    "Time a rerank request waited for its batch to start.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+RERANK_INFERENCE = histogram(
+    "rag_rerank_inference_seconds",
+    "Latency of one batched cross-encoder inference.",
+)
+
+Pair = Sequence[str]
+
+
+# ----------------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------------
+
+class FlagBackend:
+    """FlagEmbedding `FlagReranker` (PyTorch)."""
+
+    name = "flag"
+
+    def __init__(self, model_name: str = RERANKER_MODEL, use_fp16: bool = True):
+        from FlagEmbedding import FlagReranker
+
+        self.model = FlagReranker(model_name, use_fp16=use_fp16)
+
+    def compute_score(self, pairs: List[Pair]) -> List[float]:
+        scores = self.model.compute_score([list(p) for p in pairs], batch_size=max(1, len(pairs)))
+        return scores if isinstance(scores, list) else [scores]
+
+
+def export_onnx(model_class, model_name: str, cache_dir: Optional[str] = None,
+                quantize: bool = True) -> Tuple[Path, Path, str]:
+    """
+    Export `model_name` with the optimum `model_class` (and quantise it to
+    int8) under `cache_dir` unless already there. Returns the export
+    directory (tokenizer, config), the model directory and the ONNX file name.
+    """
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    cache_root = Path(cache_dir or Path.home() / ".cache" / "rag_onnx")
+    export_dir = cache_root / model_name.replace("/", "__")
+    if not (export_dir / "model.onnx").exists():
+        logger.info(f"Exporting {model_name} to ONNX at {export_dir}.")
+        model = model_class.from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+
+    if not quantize:
+        return export_dir, export_dir, "model.onnx"
+    model_dir, file_name = export_dir / "int8", "model_quantized.onnx"
+    if not (model_dir / file_name).exists():
+        logger.info(f"Quantizing {model_name} to int8 at {model_dir}.")
+        quantizer = ORTQuantizer.from_pretrained(export_dir)
+        config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=model_dir, quantization_config=config)
+    return export_dir, model_dir, file_name
+
+
+class OnnxBackend:
+    """
+    The same cross-encoder exported to ONNX Runtime, dynamically quantised
+    to int8 unless `quantize=False`. The export is cached under
+    `cache_dir` so only the first start pays for it.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str = RERANKER_MODEL, cache_dir: Optional[str] = None,
+                 quantize: bool = True, max_length: int = 512):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+
+        export_dir, model_dir, file_name = export_onnx(ORTModelForSequenceClassification, model_name,
+                                                       cache_dir or os.getenv("RERANKER_ONNX_DIR"), quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.model = ORTModelForSequenceClassification.from_pretrained(model_dir, file_name=file_name)
+        self.max_length = max_length
+
+    def compute_score(self, pairs: List[Pair]) -> List[float]:
+        queries = [p[0] for p in pairs]
+        passages = [p[1] for p in pairs]
+        inputs = self.tokenizer(queries, passages, padding=True, truncation=True,
+                                max_length=self.max_length, return_tensors="np")
+        logits = self.model(**inputs).logits
+        return [float(x) for x in logits.reshape(-1)]
+
+
+def create_backend(name: Optional[str] = None):
+    """`RERANKER_BACKEND`: `flag` (default) or `onnx`; `RERANKER_INT8=0` keeps ONNX in fp32."""
+    name = name or os.getenv("RERANKER_BACKEND", "flag")
+    if name == "onnx":
+        return OnnxBackend(quantize=os.getenv("RERANKER_INT8", "1") == "1")
+    if name == "flag":
+        return FlagBackend()
+    raise ValueError(f"Unknown reranker backend: {name}")
+
+
+# ----------------------------------------------------------------------------
+# Batching service
+# ----------------------------------------------------------------------------
+
+class _Request:
+    __slots__ = ("pairs", "future", "enqueued")
+
+    def __init__(self, pairs: List[Pair], future: "asyncio.Future"):
+        self.pairs = pairs
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class BatchingReranker:
+    """
+    Cross-request micro-batching in front of a reranker backend.
+
+    Concurrent `score()` calls are queued; a single worker task collects
+    requests until `max_batch_size` pairs are waiting or `max_wait_ms`
+    has passed since the first one, runs one inference on the executor and
+    scatters the scores back. Because only the worker runs inference, the
+    backend never sees concurrent calls.
+    """
+
+    def __init__(self, backend, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def warm_up(self) -> None:
+        self.backend.compute_score([("warm up", "warm up")])
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return self._queue
+
+    async def score(self, pairs: List[Pair]) -> List[float]:
+        if not pairs:
+            return []
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put(_Request(list(pairs), future))
+        return await future
+
+    async def _collect(self, queue: asyncio.Queue) -> List[_Request]:
+        batch = [await queue.get()]
+        size = len(batch[0].pairs)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            size += len(request.pairs)
+        return [r for r in batch if not r.future.done()]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = await self._collect(queue)
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for request in batch:
+                RERANK_QUEUE_WAIT.observe(started - request.enqueued)
+            pairs = [pair for request in batch for pair in request.pairs]
+            RERANK_BATCH_SIZE.observe(len(pairs))
+            try:
+                scores = await loop.run_in_executor(self.executor, self.backend.compute_score, pairs)
+            except Exception as exc:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(exc)
+                continue
+            RERANK_INFERENCE.observe(time.perf_counter() - started)
+
+            offset = 0
+            for request in batch:
+                count = len(request.pairs)
+                if not request.future.done():
+                    request.future.set_result(scores[offset:offset + count])
+                offset += count
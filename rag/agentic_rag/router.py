@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag.observability.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+EXEMPLARS_PATH = Path(__file__).parent / "data" / "router_exemplars.json"
+
+ROUTER_DECISIONS = counter(
+    "rag_router_decisions_total",
+    "Router outcomes per /query: routed straight to a tool, or sent to the agent.",
+    ["route", "outcome"],
+)
+# Compare the two paths to see the latency the router saves.
+QUERY_LATENCY = histogram(
+    "rag_query_duration_seconds",
+    "End-to-end /query latency by path (routed or agent).",
+    ["path"],
+)
+
+
+class RouteDecision:
+    def __init__(self, route: str, score: float, margin: float, confident: bool, scores: Dict[str, float]):
+        self.route = route
+        self.score = score
+        self.margin = margin
+        self.confident = confident
+        self.scores = scores
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "confident": self.confident,
+            "score": round(self.score, 4),
+            "margin": round(self.margin, 4),
+            "scores": {k: round(v, 4) for k, v in self.scores.items()},
+        }
+
+
+def load_exemplars(path: Optional[Path] = None) -> Dict[str, List[str]]:
+    return json.loads(Path(path or os.getenv("ROUTER_EXEMPLARS", EXEMPLARS_PATH)).read_text())
+
+
+class EmbeddingRouter:
+    """
+    Nearest-exemplar classifier over question embeddings.
+
+    A route's score is the mean cosine similarity of the question to its
+    `top_k` closest exemplars. The decision is confident when the best
+    route scores at least `min_score` and leads the runner-up by
+    `min_margin`; otherwise the caller should fall back to the agent.
+    """
+
+    def __init__(self, labels: Sequence[str], vectors: np.ndarray, min_score: float = 0.45,
+                 min_margin: float = 0.05, top_k: int = 3):
+        self.labels = np.asarray(labels)
+        self.routes = sorted(set(labels))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms == 0, 1.0, norms)
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.top_k = top_k
+
+    @classmethod
+    def from_embeddings(cls, exemplars: Dict[str, List[str]], embeddings: Sequence[Sequence[float]],
+                        **kwargs) -> "EmbeddingRouter":
+        """`embeddings` must follow the order of `exemplars` (routes, then their questions)."""
+        labels = [route for route, questions in exemplars.items() for _ in questions]
+        return cls(labels, np.asarray(embeddings, dtype=np.float32), **kwargs)
+
+    @classmethod
+    async def build(cls, embed_model, exemplars: Optional[Dict[str, List[str]]] = None) -> "EmbeddingRouter":
+        exemplars = exemplars or load_exemplars()
+        texts = [q for questions in exemplars.values() for q in questions]
+        embeddings = await embed_model.aget_text_embedding_batch(texts)
+        return cls.from_embeddings(
+            exemplars,
+            embeddings,
+            min_score=float(os.getenv("ROUTER_MIN_SCORE", "0.45")),
+            min_margin=float(os.getenv("ROUTER_MIN_MARGIN", "0.05")),
+            top_k=int(os.getenv("ROUTER_TOP_K", "3")),
+        )
+
+    def classify(self, embedding: Sequence[float]) -> RouteDecision:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        sims = self.vectors @ (query / norm if norm else query)
+        scores = {}
+        for route in self.routes:
+            route_sims = np.sort(sims[self.labels == route])[::-1][:self.top_k]
+            scores[route] = float(route_sims.mean())
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        best, score = ranked[0]
+        margin = score - ranked[1][1] if len(ranked) > 1 else score
+        confident = score >= self.min_score and margin >= self.min_margin
+        return RouteDecision(best, score, margin, confident, scores)
@@ -1,5 +1,5 @@
 from typing import List
-from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.core.base.embeddings.base import BaseEmbedding
 from fastapi import UploadFile
 from sqlalchemy.orm import Session
 from langchain_community.document_loaders import PyPDFLoader
@@ -7,10 +7,12 @@ import shutil, tempfile
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from llama_index.core import Document, StorageContext, VectorStoreIndex
-from db import get_vector_store
+from rag.agentic_rag.db import get_vector_store
+from rag.agentic_rag.llm_limits import llm_priority
 from rag.agentic_rag.model_document import LiDocument
+from rag.observability.tracing import span
 
-def ingest_pdf_to_li(file: UploadFile, embeddings: OpenAIEmbedding, db: Session) -> List[str]:
+def ingest_pdf_to_li(file: UploadFile, embeddings: BaseEmbedding, db: Session) -> List[str]:
     """
     Ingest a PDF into the li_document table using LlamaIndex.
     Returns list of node_ids for inserted chunks.
@@ -24,15 +26,15 @@ def ingest_pdf_to_li(file: UploadFile, embeddings: OpenAIEmbedding, db: Session)
     # Load and split PDF
     loader = PyPDFLoader(tmp_path)
     pages = loader.load()
-    page_texts = [page.page_content for page in pages]
-
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts: List[str] = []
-    for page in page_texts:
-        texts.extend(splitter.split_text(page))
-
-    # Convert into LlamaIndex Document objects
-    docs = [Document(text=t, metadata={"source_file": file.filename}) for t in texts]
+    docs: List[Document] = []
+    for page_number, page in enumerate(pages):
+        for text in splitter.split_text(page.page_content):
+            # chunk_index runs across pages so context packing can join neighbours.
+            metadata = {"source_file": file.filename, "page": page_number, "chunk_index": len(docs)}
+            docs.append(Document(text=text, metadata=metadata,
+                                 excluded_embed_metadata_keys=["page", "chunk_index"],
+                                 excluded_llm_metadata_keys=["page", "chunk_index"]))
 
     # Setup vector store
     store = get_vector_store("li_document")
@@ -40,14 +42,17 @@ def ingest_pdf_to_li(file: UploadFile, embeddings: OpenAIEmbedding, db: Session)
     storage_context = StorageContext.from_defaults(vector_store=store)
 
     # Insert into vector store via LlamaIndex
-    index = VectorStoreIndex.from_documents(
-        docs,
-        storage_context=storage_context,
-        embed_model=embeddings,
-    )
+    # Ingestion embeds at bulk priority, behind interactive queries.
+    with span("embedding", chunks=len(docs), target="vector_store"), llm_priority("bulk"):
+        index = VectorStoreIndex.from_documents(
+            docs,
+            storage_context=storage_context,
+            embed_model=embeddings,
+        )
 
     # Create embeddings for each chunk
-    chunk_embeddings: List[List[float]] = embeddings.get_text_embedding_batch([d.text for d in docs])
+    with span("embedding", chunks=len(docs), target="li_document"), llm_priority("bulk"):
+        chunk_embeddings: List[List[float]] = embeddings.get_text_embedding_batch([d.text for d in docs])
 
     # Build ORM rows
     rows = []
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, List, Optional, Sequence, TypeVar
+
+from langchain.memory import ConversationBufferWindowMemory, ConversationSummaryBufferMemory
+from langchain_community.chat_message_histories import ChatMessageHistory, SQLChatMessageHistory
+from langchain_core.messages import BaseMessage
+
+from rag.agentic_rag.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+# `window` keeps the last AGENT_MEMORY_WINDOW exchanges; `summary` folds older
+# turns into a running summary once the history exceeds AGENT_MEMORY_MAX_TOKENS.
+MEMORY_KIND = os.getenv("AGENT_MEMORY", "window")
+MEMORY_WINDOW = int(os.getenv("AGENT_MEMORY_WINDOW", "5"))
+MEMORY_MAX_TOKENS = int(os.getenv("AGENT_MEMORY_MAX_TOKENS", "1000"))
+# Store window-memory messages in Postgres so sessions survive eviction and restarts.
+MEMORY_PERSIST = os.getenv("AGENT_MEMORY_PERSIST", "0") == "1"
+MEMORY_TABLE = os.getenv("AGENT_MEMORY_TABLE", "agent_chat_history")
+
+MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "1000"))
+SESSION_TTL = float(os.getenv("AGENT_SESSION_TTL", "3600"))
+
+T = TypeVar("T")
+
+
+class WindowedSQLChatMessageHistory(SQLChatMessageHistory):
+    """
+    `SQLChatMessageHistory` holding only the last `max_messages` messages
+    of a session: reads fetch just those rows, and older ones are deleted
+    in the transaction that adds new ones, so a turn costs the same however
+    long the conversation has been going. The async methods run the sync
+    ones in a thread (the base class's need an async engine).
+    """
+
+    def __init__(self, *args, max_messages: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_messages = max_messages
+
+    def _rows(self, session):
+        model = self.sql_model_class
+        return session.query(model).filter(getattr(model, self.session_id_field_name) == self.session_id)
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        with self._make_sync_session() as session:
+            records = (self._rows(session).order_by(self.sql_model_class.id.desc())
+                       .limit(self.max_messages).all())
+            return [self.converter.from_sql_model(record) for record in reversed(records)]
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        model = self.sql_model_class
+        with self._make_sync_session() as session:
+            for message in messages:
+                session.add(self.converter.to_sql_model(message, self.session_id))
+            session.flush()
+            oldest_kept = (self._rows(session).with_entities(model.id).order_by(model.id.desc())
+                           .offset(self.max_messages - 1).limit(1).scalar())
+            if oldest_kept is not None:
+                self._rows(session).filter(model.id < oldest_kept).delete(synchronize_session=False)
+            session.commit()
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        return await asyncio.to_thread(lambda: self.messages)
+
+    async def aadd_message(self, message: BaseMessage) -> None:
+        await self.aadd_messages([message])
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        await asyncio.to_thread(self.add_messages, messages)
+
+    async def aclear(self) -> None:
+        await asyncio.to_thread(self.clear)
+
+
+def build_memory(session_id: str, llm):
+    """Bounded chat memory for one session, exposed to the prompt as `chat_history`."""
+    if MEMORY_KIND == "summary":
+        # The summary lives in the memory object, so it is kept in process only.
+        return ConversationSummaryBufferMemory(
+            llm=llm,
+            max_token_limit=MEMORY_MAX_TOKENS,
+            memory_key="chat_history",
+            return_messages=True,
+        )
+    if MEMORY_PERSIST:
+        # The window memory reads the last k exchanges, two messages each.
+        history = WindowedSQLChatMessageHistory(session_id=session_id, connection=get_engine(),
+                                                table_name=MEMORY_TABLE, max_messages=2 * MEMORY_WINDOW)
+    else:
+        history = ChatMessageHistory()
+    return ConversationBufferWindowMemory(
+        k=MEMORY_WINDOW,
+        chat_memory=history,
+        memory_key="chat_history",
+        return_messages=True,
+    )
+
+
+class SessionEntry(Generic[T]):
+    def __init__(self, value: T):
+        self.value = value
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionStore(Generic[T]):
+    """
+    LRU of per-session objects (here: agents with their own memory).
+
+    Sessions idle for longer than `ttl` seconds are dropped, and the least
+    recently used one is evicted once `max_sessions` is exceeded, except
+    while a turn holds its lock. Each
+    session carries an `asyncio.Lock` so turns of one conversation run in
+    order while different sessions run concurrently.
+    """
+
+    def __init__(self, factory: Callable[[str], T], max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, SessionEntry[T]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> SessionEntry[T]:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = SessionEntry(self.factory(session_id))
+                self._sessions[session_id] = session
+                self._evict(now)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def drop(self, session_id: str) -> Optional[SessionEntry[T]]:
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def _in_use(self, session_id: str, session: SessionEntry[T], now: float) -> bool:
+        """
+        Whether a turn holds the session's lock. Such a session is kept (and
+        counts as just used): a new entry for its id would come with a new
+        lock, and the next turn would run alongside the current one.
+        """
+        if not session.lock.locked():
+            return False
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        return True
+
+    def _evict(self, now: float) -> None:
+        # Sessions in use may keep the store above `max_sessions` for a while.
+        for session_id, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if not self._in_use(session_id, session, now):
+                del self._sessions[session_id]
+                logger.debug(f"Evicted agent session {session_id}.")
+
+    def _expire(self, now: float) -> None:
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_used <= self.ttl:
+                break
+            if not self._in_use(session_id, session, now):
+                del self._sessions[session_id]
+                logger.debug(f"Expired idle agent session {session_id}.")
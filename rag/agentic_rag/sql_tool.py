@@ -0,0 +1,203 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_community.utilities.sql_database import SQLDatabase, truncate_word
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
+
+from rag.agentic_rag.db import get_db_url, get_engine
+from rag.agentic_rag.tool_cache import ToolCache, shared_generations
+
+logger = logging.getLogger(__name__)
+
+# Tables the SQL tool may see; everything else (chat history, alembic) stays
+# out of the prompt. Columns in SQL_TOOL_HIDDEN_COLUMNS and vector columns
+# are left out of the summary too.
+SQL_TOOL_TABLES = [t.strip() for t in os.getenv("SQL_TOOL_TABLES", "li_document,document").split(",") if t.strip()]
+SQL_TOOL_HIDDEN_COLUMNS = {c.strip() for c in os.getenv("SQL_TOOL_HIDDEN_COLUMNS", "embedding").split(",") if c.strip()}
+SQL_TOOL_ROW_LIMIT = int(os.getenv("SQL_TOOL_ROW_LIMIT", "50"))
+SQL_TOOL_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_TOOL_STATEMENT_TIMEOUT_MS", "10000"))
+SQL_TOOL_RESULT_TTL = float(os.getenv("SQL_TOOL_RESULT_TTL", "60"))
+
+# Tokens the checks must see as Postgres does: string literals (including
+# E'' strings with backslash escapes), quoted identifiers and comments.
+# Dollar quoting, nested block comments and unterminated quotes are refused
+# rather than interpreted. Everything between tokens is plain SQL.
+TOKEN_RE = re.compile(r"""
+      (?P<literal>(?<![\w$])[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|"(?:[^"]|"")*")
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*.*?\*/)
+    | (?P<dollar_quote>\$\w*\$)
+    | (?P<unterminated>['"]|/\*)
+""", re.VERBOSE | re.DOTALL)
+WHITESPACE_RE = re.compile(r"\s+")
+READ_KEYWORDS = ("select", "with")
+
+
+def _tokens(sql: str) -> List[Tuple[str, str]]:
+    """`(kind, text)` pieces of `sql`: `code`, `literal` or `comment`; raises `ValueError` on SQL it cannot scan safely."""
+    tokens, pos = [], 0
+    for match in TOKEN_RE.finditer(sql):
+        if match.start() > pos:
+            tokens.append(("code", sql[pos:match.start()]))
+        kind, text = match.lastgroup, match.group()
+        if kind == "unterminated":
+            raise ValueError("Unterminated string, identifier or comment in SQL.")
+        if kind == "dollar_quote":
+            raise ValueError("Dollar-quoted strings are not allowed.")
+        if kind == "block_comment" and "/*" in text[2:]:
+            raise ValueError("Nested comments are not allowed.")
+        tokens.append(("literal" if kind == "literal" else "comment", text))
+        pos = match.end()
+    if pos < len(sql):
+        tokens.append(("code", sql[pos:]))
+    return tokens
+
+
+def strip_comments(sql: str) -> str:
+    """`sql` without comments (line breaks kept), surrounding whitespace and trailing semicolons."""
+    stripped = "".join(" " if kind == "comment" else text for kind, text in _tokens(sql)).strip()
+    while stripped.endswith(";"):
+        stripped = stripped[:-1].rstrip()
+    return stripped
+
+
+def normalize_sql(sql: str) -> str:
+    """Cache key for `sql`: comments dropped, whitespace collapsed and lowercased outside literals."""
+    parts = [text if kind == "literal" else WHITESPACE_RE.sub(" ", text).casefold()
+             for kind, text in _tokens(strip_comments(sql))]
+    return "".join(parts).strip()
+
+
+def validate_select(sql: str) -> str:
+    """
+    The statement to run for `sql` (comments and trailing semicolons
+    removed) if it is a single SELECT/WITH statement; raises `ValueError`
+    otherwise. Data-modifying CTEs pass this check; the read-only
+    transaction `run` uses rejects them.
+    """
+    statement = strip_comments(sql)
+    if any(";" in text for kind, text in _tokens(statement) if kind == "code"):
+        raise ValueError("Only a single SQL statement is allowed.")
+    first = WHITESPACE_RE.split(statement.lstrip("("), 1)[0].casefold()
+    if first not in READ_KEYWORDS:
+        raise ValueError("Only SELECT queries are allowed.")
+    return statement
+
+
+def create_readonly_engine(url: Optional[str] = None) -> Engine:
+    """
+    Pooled engine with a statement timeout and standard-conforming strings
+    (the literal rules `validate_select` assumes). Sessions default to
+    read-only, but a default can be overridden, so `GuardedSQLDatabase`
+    also makes each transaction read-only; SQL_TOOL_DATABASE_URL should
+    point at a role that may only SELECT the allow-listed tables.
+    """
+    url = url or os.getenv("SQL_TOOL_DATABASE_URL") or get_db_url()
+    options = (f"-c default_transaction_read_only=on -c standard_conforming_strings=on "
+               f"-c statement_timeout={SQL_TOOL_STATEMENT_TIMEOUT_MS}")
+    return create_engine(
+        url,
+        pool_size=int(os.getenv("SQL_TOOL_POOL_SIZE", "4")),
+        max_overflow=0,
+        pool_timeout=10,
+        pool_pre_ping=True,
+        connect_args={"options": options},
+    )
+
+
+def schema_summary(engine: Engine, tables: Sequence[str]) -> Dict[str, str]:
+    """`CREATE TABLE`-style summary per table, without hidden and vector columns or sample rows."""
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    summary = {}
+    for table in tables:
+        if table not in existing:
+            logger.warning(f"SQL tool table {table} does not exist; skipping it.")
+            continue
+        columns, omitted = [], []
+        for column in inspector.get_columns(table):
+            type_name = str(column["type"])
+            if column["name"] in SQL_TOOL_HIDDEN_COLUMNS or type_name.upper().startswith("VECTOR"):
+                omitted.append(column["name"])
+                continue
+            columns.append(f"\t{column['name']} {type_name}")
+        info = f"CREATE TABLE {table} (\n" + ",\n".join(columns) + "\n)"
+        if omitted:
+            info += f"\n/* omitted columns: {', '.join(omitted)} */"
+        summary[table] = info
+    return summary
+
+
+class GuardedSQLDatabase(SQLDatabase):
+    """
+    `SQLDatabase` for LLM-generated queries.
+
+    Only the allow-listed tables are visible, and their schema summary is
+    built once from the main engine instead of reflecting every table. The
+    rendered table info is cached per table selection. `run` accepts a
+    single SELECT, executes it in a read-only transaction, returns at most
+    `row_limit` rows and caches the result by normalized SQL.
+    """
+
+    def __init__(self, engine: Engine, tables: Sequence[str], summary: Dict[str, str],
+                 row_limit: int = SQL_TOOL_ROW_LIMIT, cache: Optional[ToolCache] = None, **kwargs: Any):
+        if not summary:
+            # An empty include_tables would expose every table.
+            raise ValueError(f"None of the SQL tool tables exist: {', '.join(tables)}")
+        super().__init__(engine, include_tables=list(summary), sample_rows_in_table_info=0,
+                         custom_table_info=summary, lazy_table_reflection=True, **kwargs)
+        self.row_limit = row_limit
+        self.result_cache = cache
+        self._table_info: Dict[Tuple[str, ...], str] = {}
+
+    @classmethod
+    def from_env(cls, cache: Optional[ToolCache] = None) -> "GuardedSQLDatabase":
+        summary = schema_summary(get_engine(), SQL_TOOL_TABLES)
+        return cls(create_readonly_engine(), SQL_TOOL_TABLES, summary, cache=cache)
+
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        key = tuple(sorted(table_names)) if table_names else ()
+        unknown = set(key) - set(self._custom_table_info)
+        if unknown:
+            raise ValueError(f"table_names {unknown} not found in database")
+        if key not in self._table_info:
+            self._table_info[key] = "\n\n".join(
+                self._custom_table_info[t] for t in (key or self.get_usable_table_names()))
+        return self._table_info[key]
+
+    def run(self, command: str, fetch: str = "all", include_columns: bool = False, **kwargs: Any) -> str:
+        sql = validate_select(command)
+        if self.result_cache is None:
+            return self._run_limited(sql, include_columns)
+        return self.result_cache.get_or_compute("sql_result", f"{include_columns}:{sql}",
+                                                lambda: self._run_limited(sql, include_columns))
+
+    def _run_limited(self, sql: str, include_columns: bool) -> str:
+        with self._engine.connect() as connection, connection.begin():
+            # Must be the transaction's first statement; the query cannot end
+            # the transaction since it is a single statement.
+            connection.execute(text("SET TRANSACTION READ ONLY"))
+            # The limit goes into the query, so Postgres never sends (nor the
+            # client-side cursor buffers) more rows than are read; the extra
+            # row tells whether the result was cut.
+            result = connection.execute(text(f"SELECT * FROM ({sql}) AS limited LIMIT :row_cap"),
+                                        {"row_cap": self.row_limit + 1})
+            columns = list(result.keys())
+            rows = result.fetchmany(self.row_limit + 1)
+        truncated = len(rows) > self.row_limit
+        values = [tuple(truncate_word(v, length=self._max_string_length) for v in row)
+                  for row in rows[:self.row_limit]]
+        if not values:
+            return ""
+        output = str([dict(zip(columns, v)) for v in values] if include_columns else values)
+        if truncated:
+            output += f"\n(first {self.row_limit} rows only)"
+        return output
+
+
+SQL_RESULT_CACHE = ToolCache({"sql_result": SQL_TOOL_RESULT_TTL},
+                             max_entries=int(os.getenv("SQL_TOOL_RESULT_CACHE_SIZE", "256")),
+                             normalizer=normalize_sql, generations=shared_generations())
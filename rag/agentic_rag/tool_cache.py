@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from rag.agentic_rag.instrumentation import STAGE_CACHE
+
+try:
+    import fcntl
+except ImportError:  # Windows: updates from concurrent workers may then be lost
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Seconds a result stays valid per tool, overridable via TOOL_CACHE_TTL_<TOOL>;
+# 0 disables caching for that tool.
+DEFAULT_TTLS = {
+    "vector_search": 600.0,
+    "sql_query": 60.0,
+    "web_search": 1800.0,
+}
+# Cached results that depend on the stored documents (`sql_result` is the SQL
+# tool's result cache); uploads and deletions in either app invalidate them.
+DOCUMENT_TOOLS = ("vector_search", "sql_query", "sql_result")
+
+
+def normalize(query: str) -> str:
+    return WHITESPACE_RE.sub(" ", query).strip().casefold()
+
+
+class SharedGenerations:
+    """
+    Per-tool generation counters in a small JSON file, locked with `flock`,
+    so an invalidation in one worker process (or the other app) is seen by
+    every process on the host. The file is opened per call, which keeps
+    pre-forked workers apart and costs a few microseconds per lookup.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _locked(self, exclusive: bool):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        f = os.fdopen(fd, "r+")
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return f
+
+    @staticmethod
+    def _read(f) -> Dict[str, int]:
+        try:
+            return json.loads(f.read() or "{}")
+        except ValueError:
+            return {}
+
+    def get(self, tool: str) -> int:
+        with self._locked(exclusive=False) as f:
+            return self._read(f).get(tool, 0)
+
+    def bump(self, tools: Iterable[str]) -> None:
+        with self._locked(exclusive=True) as f:
+            generations = self._read(f)
+            for tool in tools:
+                generations[tool] = generations.get(tool, 0) + 1
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(generations))
+
+
+def shared_generations() -> SharedGenerations:
+    """TOOL_CACHE_STATE_FILE, shared by both apps and all their workers on the host."""
+    return SharedGenerations(os.getenv("TOOL_CACHE_STATE_FILE",
+                                       os.path.join(tempfile.gettempdir(), "rag_tool_cache_generations")))
+
+
+def invalidate_documents() -> None:
+    """Invalidate, in every process, the cached results that depend on the stored documents."""
+    shared_generations().bump(DOCUMENT_TOOLS)
+    logger.info(f"Invalidated cached results of {', '.join(DOCUMENT_TOOLS)}.")
+
+
+class ToolCache:
+    """
+    Results of agent tools keyed by `(tool, normalizer(input))`.
+
+    Entries expire after the tool's TTL and the least recently used entry
+    is evicted beyond `max_entries`. Each entry records its tool's
+    generation; `invalidate(tool)` bumps it, so older entries and results
+    computed while it happened are not served. With `generations` (a
+    `SharedGenerations`) the counters are shared between processes,
+    otherwise they are per cache.
+    Only successful results are cached: `compute` should raise on failure.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 1024,
+                 normalizer: Callable[[str], str] = normalize,
+                 generations: Optional[SharedGenerations] = None):
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries
+        self.normalizer = normalizer
+        self.shared = generations
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, int, str]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ToolCache":
+        ttls = {tool: float(os.getenv(f"TOOL_CACHE_TTL_{tool.upper()}", ttl)) for tool, ttl in DEFAULT_TTLS.items()}
+        return cls(ttls, max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024")),
+                   generations=shared_generations())
+
+    def generation(self, tool: str) -> int:
+        if self.shared is not None:
+            return self.shared.get(tool)
+        with self._lock:
+            return self._generations.get(tool, 0)
+
+    def get(self, tool: str, query: str) -> Optional[str]:
+        key = (tool, self.normalizer(query))
+        with self._lock:
+            if key not in self._entries:
+                return None
+        generation = self.generation(tool)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, entry_generation, value = entry
+            if expires_at < time.monotonic() or entry_generation != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, tool: str, query: str, value: str, generation: Optional[int] = None) -> None:
+        ttl = self.ttls.get(tool, 0.0)
+        if ttl <= 0:
+            return
+        current = self.generation(tool)
+        if generation is not None and generation != current:
+            return
+        with self._lock:
+            key = (tool, self.normalizer(query))
+            self._entries[key] = (time.monotonic() + ttl, current, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, tool: str, query: str, compute: Callable[[], str]) -> str:
+        if self.ttls.get(tool, 0.0) <= 0:
+            return compute()
+        cached = self.get(tool, query)
+        if cached is not None:
+            STAGE_CACHE.inc(stage=tool, result="hit")
+            return cached
+        STAGE_CACHE.inc(stage=tool, result="miss")
+        generation = self.generation(tool)
+        value = compute()
+        self.put(tool, query, value, generation)
+        return value
+
+    def invalidate(self, tool: Optional[str] = None) -> int:
+        """Drop the entries of `tool` (all tools if `None`); returns how many were dropped here."""
+        tools = [tool] if tool is not None else list(self.ttls)
+        if self.shared is not None:
+            self.shared.bump(tools)
+        with self._lock:
+            if self.shared is None:
+                for name in tools:
+                    self._generations[name] = self._generations.get(name, 0) + 1
+            keys = [key for key in self._entries if key[0] in tools]
+            for key in keys:
+                del self._entries[key]
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached results of {tool or 'all tools'}.")
+        return len(keys)
+
+
+TOOL_CACHE = ToolCache.from_env()
@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict
+
+from rag.agentic_rag.instrumentation import STAGE_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+# Per-tool timeout in seconds (TOOL_TIMEOUT_<TOOL>) and number of calls that
+# may run at once across all requests (TOOL_CONCURRENCY_<TOOL>).
+DEFAULT_TIMEOUTS = {
+    "vector_search": 15.0,
+    "sql_query": 20.0,
+    "web_search": 10.0,
+}
+DEFAULT_CONCURRENCY = {
+    "vector_search": 8,
+    "sql_query": 4,
+    "web_search": 4,
+}
+
+TOOL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=sum(int(os.getenv(f"TOOL_CONCURRENCY_{t.upper()}", n)) for t, n in DEFAULT_CONCURRENCY.items()),
+    thread_name_prefix="tool",
+)
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _semaphore(tool: str) -> asyncio.Semaphore:
+    if tool not in _semaphores:
+        limit = int(os.getenv(f"TOOL_CONCURRENCY_{tool.upper()}", DEFAULT_CONCURRENCY.get(tool, 4)))
+        _semaphores[tool] = asyncio.Semaphore(limit)
+    return _semaphores[tool]
+
+
+def _timeout(tool: str) -> float:
+    return float(os.getenv(f"TOOL_TIMEOUT_{tool.upper()}", DEFAULT_TIMEOUTS.get(tool, 15.0)))
+
+
+async def bounded_call(tool: str, func: Callable[[str], str], query: str) -> str:
+    """
+    Run the blocking tool `func` on `TOOL_EXECUTOR` within the tool's
+    concurrency limit; raises `asyncio.TimeoutError` after its timeout.
+    The slot is held until the worker thread really finishes, so
+    timed-out calls cannot pile up threads.
+    """
+    semaphore = _semaphore(tool)
+    await semaphore.acquire()
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    future = loop.run_in_executor(TOOL_EXECUTOR, functools.partial(ctx.run, func, query))
+    future.add_done_callback(lambda _: semaphore.release())
+    return await asyncio.wait_for(asyncio.shield(future), _timeout(tool))
+
+
+def bounded_coroutine(tool: str, func: Callable[[str], str]) -> Callable[[str], Awaitable[str]]:
+    """
+    Async form of the blocking tool `func` for `Tool(coroutine=...)`.
+
+    The agent executor gathers the tool calls of one step, so with this
+    they run side by side (see `bounded_call`). A timeout is returned to
+    the model as a message.
+    """
+    async def run(query: str) -> str:
+        try:
+            return await bounded_call(tool, func, query)
+        except asyncio.TimeoutError:
+            STAGE_FALLBACKS.inc(stage=tool)
+            logger.warning(f"Tool {tool} timed out after {_timeout(tool)}s.")
+            return f"{tool} timed out after {_timeout(tool):g}s."
+
+    return run
@@ -7,8 +7,15 @@ from sqlalchemy.orm import Session
 import openai, os
 from dotenv import load_dotenv
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from rag.observability.metrics import CONTENT_TYPE_LATEST, INGESTED_CHUNKS, MetricsMiddleware, render_latest
+from rag.observability.tracing import TRACE_STORE, TracingMiddleware
+from rag.agentic_rag.tool_cache import invalidate_documents
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware, app_name="rag")
+app.add_middleware(TracingMiddleware, app_name="rag")
 
 load_dotenv() 
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -27,7 +34,11 @@ async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)
     with open(path, "wb") as f:
         f.write(await file.read())
     # ingest_pdf will need to accept a db session
-    ingest_pdf(path, file.filename)
+    # Bulk embedding waits for rate-limit budget with blocking sleeps; keep it off the loop.
+    chunk_count = await run_in_threadpool(ingest_pdf, path, file.filename)
+    INGESTED_CHUNKS.inc(chunk_count, app="rag")
+    # The agentic app's cached tool results may cover the document table.
+    invalidate_documents()
     return {"status": "uploaded"}
 
 @app.get("/documents/", response_model=List[dict])
@@ -66,4 +77,20 @@ def delete_document(doc_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Document not found")
     db.delete(doc)
     db.commit()
+    invalidate_documents()
     return {"status": "deleted"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/debug/traces")
+def debug_list_traces(slow_only: bool = False, limit: int = 50):
+    return TRACE_STORE.recent(slow_only=slow_only, limit=limit)
+
+@app.get("/debug/traces/{trace_id}")
+def debug_get_trace(trace_id: str):
+    trace = TRACE_STORE.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
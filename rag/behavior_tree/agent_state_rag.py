@@ -1,3 +1,10 @@
+import os
+
+from road_graph import PathPlanner, RoadGraph
+from route_store import RouteStore
+from scenario import load_scenario
+
+
 # Define the Agent class to track state
 class Agent:
     def __init__(self, name, start_location):
@@ -9,6 +16,27 @@ class Agent:
         self.task_end = None  # will be set when a pickup task is assigned
         self.current_path = []
         self.path_index = 0
+        # (from, to) of the road found blocked and the scenario events blocking
+        # it, until ExploreAction handles them
+        self.blocked_edge = None
+        self.blocked_by = []
+        # Roads blocked for this agent only (agent or has_item filtered
+        # events), by the time step they reopen
+        self.avoid = {}
+
+    def avoided(self, now):
+        """Roads this agent still routes around at time step `now`."""
+        self.avoid = {edge: until for edge, until in self.avoid.items() if until > now}
+        return set(self.avoid)
+
+    def on_route_change(self, changes):
+        """Drop the current path if a changed road lies ahead; the next move replans."""
+        ahead = set(zip(self.current_path[self.path_index:], self.current_path[self.path_index + 1:]))
+        changed = [f"{c.u}-{c.v}" for c in changes if (c.u, c.v) in ahead]
+        if changed:
+            print(f"{self.name}: Road {', '.join(changed)} on its path changed, drops the path")
+            self.current_path = []
+            self.path_index = 0
 
     def set_pickup_task(self, item_location):
         """Assign a new pickup task for the agent (go from current location to item_location)."""
@@ -26,20 +54,36 @@ class Agent:
         self.current_path = []
         self.path_index = 0
 
-# Initialize the RAG database with initial paths (bidirectional for simplicity)
-rag_db = {
-    ("E", "A"): ["E", "X", "Y", "A"],
-    ("A", "E"): ["A", "X", "Y", "E"],
-    ("E", "B"): ["E", "Z", "B"],
-    ("B", "E"): ["B", "Z", "E"],
-    ("E", "C"): ["E", "W", "V", "C"],
-    ("C", "E"): ["C", "V", "W", "E"],
-    ("E", "D"): ["E", "U", "T", "D"],
-    ("D", "E"): ["D", "T", "U", "E"]
-}
-
-# Predefined alternate paths that agents will "discover" if certain routes are blocked
-new_path_E_C = ["E", "W", "P", "Q", "C"]  # alternate path from E to C (bypassing V)
-new_path_C_E = ["C", "Q", "P", "W", "E"]  # alternate path from C to E (reverse route)
-new_path_A_E = ["A", "X", "M", "N", "E"]  # alternate path from A to E (bypassing Y)
-new_path_E_A = ["E", "N", "M", "X", "A"]  # alternate path from E to A (reverse route)
+# The road map the agents plan on (cost per edge, both directions). The
+# detours W-P-Q-C, X-A and X-M-N-E are longer than the main roads, so agents
+# only take them once a main road is reported blocked.
+ROAD_EDGES = [
+    ("E", "X", 1.0), ("X", "Y", 1.0), ("Y", "A", 1.0),
+    ("E", "Z", 1.0), ("Z", "B", 1.0),
+    ("E", "W", 1.0), ("W", "V", 1.0), ("V", "C", 1.0),
+    ("E", "U", 1.0), ("U", "T", 1.0), ("T", "D", 1.0),
+    ("W", "P", 1.5), ("P", "Q", 1.0), ("Q", "C", 1.0),
+    ("X", "A", 2.5),
+    ("X", "M", 1.5), ("M", "N", 1.5), ("N", "E", 1.5),
+]
+
+
+def build_road_graph(edges=ROAD_EDGES, positions=None):
+    graph = RoadGraph()
+    for node, position in (positions or {}).items():
+        graph.add_node(node, position)
+    for u, v, cost in edges:
+        graph.add_edge(u, v, cost)
+    return graph
+
+
+# The scenario (see scenario.py) the simulation runs: BT_SCENARIO, default
+# the demo's blockages on the map above.
+DEMO_SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios", "demo.json")
+scenario = load_scenario(os.getenv("BT_SCENARIO") or DEMO_SCENARIO)
+
+# Shared map, planner and route store: blockages one agent reports reach the
+# agents whose paths use that road (and, with BT_ROUTE_STORE_URL, the next run).
+road_graph = build_road_graph(scenario.edges or ROAD_EDGES, scenario.positions)
+planner = PathPlanner(road_graph)
+route_store = RouteStore.from_env(road_graph)
@@ -0,0 +1,85 @@
+import asyncio
+
+import py_trees
+from py_trees.common import Status
+
+
+# Concurrent ticking. A coroutine behaviour starts its I/O (a RAG lookup, a
+# move that takes time) on the event loop and returns RUNNING until it is
+# done; its effects on shared state are applied in a plain method when a
+# later tick collects the result. `tick_concurrently` ticks every agent in
+# a fixed order, awaits everything in flight together, and ticks again only
+# the agents whose awaits finished, so effects always happen in agent order.
+
+# Event loop for coroutine behaviours ticked outside of one (the sequential runner).
+_sync_loop = None
+
+
+class AsyncBehaviour(py_trees.behaviour.Behaviour):
+    """
+    A behaviour whose work is `async fetch()`. `fetch` must not touch shared
+    state; `apply(result)` does that and returns the status. Inside a
+    running event loop the behaviour returns RUNNING until `fetch` is done;
+    outside one it runs `fetch` to completion within the tick.
+    """
+
+    def __init__(self, name):
+        super().__init__(name=name)
+        self.task = None
+
+    async def fetch(self):
+        return None
+
+    def apply(self, result):
+        return Status.SUCCESS
+
+    def update(self):
+        global _sync_loop
+        if self.task is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                if _sync_loop is None:
+                    _sync_loop = asyncio.new_event_loop()
+                return self.apply(_sync_loop.run_until_complete(self.fetch()))
+            self.task = asyncio.ensure_future(self.fetch())
+            return Status.RUNNING
+        if not self.task.done():
+            return Status.RUNNING
+        task, self.task = self.task, None
+        return self.apply(task.result())
+
+    def terminate(self, new_status):
+        # Interrupted by a higher-priority branch: the result is no longer wanted.
+        if new_status == Status.INVALID and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+def pending_tasks(agent):
+    return [node.task for node in agent.tree.root.iterate()
+            if isinstance(node, AsyncBehaviour) and node.task is not None]
+
+
+async def tick_concurrently(agents, deadline=None):
+    """
+    One time step for all `agents`: their awaits overlap, so the step lasts
+    as long as the slowest agent, at most `deadline` seconds. Returns the
+    agents still awaiting at the deadline; they keep RUNNING into the next
+    step.
+    """
+    loop = asyncio.get_running_loop()
+    end = None if deadline is None else loop.time() + deadline
+    ready = list(agents)
+    while ready:
+        for agent in ready:
+            agent.tree.tick()
+        tasks = [task for agent in agents for task in pending_tasks(agent)]
+        if not tasks:
+            return []
+        timeout = None if end is None else end - loop.time()
+        if timeout is not None and timeout <= 0:
+            break
+        await asyncio.wait(tasks, timeout=timeout)
+        ready = [agent for agent in agents if any(task.done() for task in pending_tasks(agent))]
+    return [agent for agent in agents if pending_tasks(agent)]
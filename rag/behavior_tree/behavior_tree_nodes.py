@@ -1,8 +1,20 @@
+import math
+
 import py_trees
-import time
 from py_trees.common import Status
-from agent_state_rag import rag_db, new_path_A_E, new_path_C_E, new_path_E_A, new_path_E_C
+from agent_state_rag import planner, road_graph, route_store, scenario
+from async_tick import AsyncBehaviour
 from py_trees.blackboard import Blackboard
+from road_graph import AvoidingGraph, astar
+from scenario import is_shared
+from sim_clock import get_clock
+
+# Simulated seconds each action takes (see sim_clock). Timed actions are
+# coroutine behaviours (see async_tick), so agents can take them concurrently.
+MOVE_SECONDS = 2.0
+BLOCKED_SECONDS = 2.0
+PICKUP_SECONDS = 2.0
+DROPOFF_SECONDS = 2.0
 
 # Condition: checks if the agent is currently carrying an item
 class HasItem(py_trees.behaviour.Behaviour):
@@ -22,56 +34,101 @@ class NoItem(py_trees.behaviour.Behaviour):
     def update(self):
         return Status.SUCCESS if not self.agent.has_item else Status.FAILURE
 
-# Action: Query the RAG for a path from task_start to task_end
-class QueryRAG(py_trees.behaviour.Behaviour):
+def current_step():
+    try:
+        return Blackboard.get("current_time")
+    except KeyError:
+        return 0
+
+def plan_route(agent, start, end):
+    """The shared (cached) plan, or A* around the roads blocked for this agent only while there are any."""
+    avoid = agent.avoided(current_step())
+    if avoid:
+        return astar(AvoidingGraph(road_graph, avoid), start, end)
+    return planner.plan(start, end)
+
+def adopt_route(agent, start, end, path):
+    """Take `path` as the agent's route and watch its roads; False if there is no route."""
+    if path is None:
+        print(f"{agent.name}: Queries RAG for {start} -> {end}, no open route")
+        return False
+    agent.current_path = path
+    agent.path_index = 0
+    route_store.watch(agent.name, path, agent.on_route_change)
+    print(f"{agent.name}: Queries RAG for {start} -> {end}, gets {path}")
+    return True
+
+def query_route(agent):
+    """Plan from the current location to task_end right away."""
+    start, end = agent.current_location, agent.task_end
+    return adopt_route(agent, start, end, plan_route(agent, start, end))
+
+# Action: Query the planner for a path from the current location to task_end
+class QueryRAG(AsyncBehaviour):
     def __init__(self, agent):
         super().__init__(name=f"{agent.name}_QueryRAG")
         self.agent = agent
 
     def update(self):
-        
-        if not self.agent.current_path:
-            start, end = self.agent.task_start, self.agent.task_end
-            path = rag_db[(start,end)]
-            self.agent.current_path = path[:]
-            self.agent.path_index = self.agent.current_path.index(self.agent.current_location)
-            print(f"{self.agent.name}: Queries RAG for {start} -> {end}, gets {path}")
-        return Status.SUCCESS
+        if self.task is None and self.agent.current_path:
+            return Status.SUCCESS
+        return super().update()
+
+    async def fetch(self):
+        # The lookup to await once routes come from a remote RAG service
+        start, end = self.agent.current_location, self.agent.task_end
+        return start, end, plan_route(self.agent, start, end)
+
+    def apply(self, result):
+        return Status.SUCCESS if adopt_route(self.agent, *result) else Status.FAILURE
 
 # Action: Follow the current path one step at a time
-class FollowPath(py_trees.behaviour.Behaviour):
+class FollowPath(AsyncBehaviour):
     def __init__(self, agent):
         super().__init__(name=f"{agent.name}_FollowPath")
         self.agent = agent
-        
+        # (next node, blocking events, extra seconds) of the move in progress
+        self.move = None
 
     def update(self):
+        if self.task is not None:
+            return super().update()
         try:
             current_time = Blackboard.get("current_time")
         except KeyError:
             return Status.FAILURE
-        # If no path or already at end, nothing to do
-        if not self.agent.current_path or self.agent.path_index >= len(self.agent.current_path) - 1:
+        # A route change may have dropped the path on the way: replan from here
+        if not self.agent.current_path and not query_route(self.agent):
+            return Status.FAILURE
+        # Already at the end, nothing to do
+        if self.agent.path_index >= len(self.agent.current_path) - 1:
             return Status.SUCCESS
         # Determine the next node on the path
-        next_index = self.agent.path_index + 1
-        next_node = self.agent.current_path[next_index]
-        # Check for dynamic blockage scenarios:
-        if (self.agent.name == "Agent3" and next_node == "V" and current_time == 2):
-            # Agent3 trying to go through V at time 1 -> blocked
-            time.sleep(2)
-            print(f"{self.agent.name}: Finds {next_node} is blocked.")
-            return Status.FAILURE
-        if (self.agent.name == "Agent1" and next_node == "Y"  and not self.agent.has_item  and current_time == 2):
-            # Agent1 trying to return via Y at time 4 -> blocked
-            time.sleep(2)
+        next_node = self.agent.current_path[self.agent.path_index + 1]
+        # Blockages and slow traffic from the scenario's schedule
+        here = self.agent.current_location
+        blocked = scenario.schedule.blocking(current_time, here, next_node, self.agent)
+        delay = scenario.schedule.delay(current_time, here, next_node, self.agent)
+        self.move = (next_node, blocked, delay)
+        return super().update()
+
+    async def fetch(self):
+        _, blocked, delay = self.move
+        await get_clock().asleep(BLOCKED_SECONDS if blocked else MOVE_SECONDS + delay)
+
+    def apply(self, result):
+        (next_node, blocked, _), self.move = self.move, None
+        if blocked:
             print(f"{self.agent.name}: Finds {next_node} is blocked.")
+            self.agent.blocked_edge = (self.agent.current_location, next_node)
+            self.agent.blocked_by = blocked
             return Status.FAILURE
         # If not blocked, move to the next node
-        time.sleep(2)
         print(f"{self.agent.name}: Moves from {self.agent.current_location} to {next_node}")
         self.agent.current_location = next_node
-        self.agent.path_index = next_index
+        # (a route change during the move drops the path; the next move replans)
+        if self.agent.current_path:
+            self.agent.path_index += 1
         # If this move reached the end of the path, we're at the destination
         if self.agent.current_location == self.agent.task_end:
             return Status.SUCCESS
@@ -79,81 +136,82 @@ class FollowPath(py_trees.behaviour.Behaviour):
             return Status.RUNNING
 
 # Action: Pick up item at current location (executes when agent reaches an item location)
-class PickUpItem(py_trees.behaviour.Behaviour):
+class PickUpItem(AsyncBehaviour):
     def __init__(self, agent):
         super().__init__(name=f"{agent.name}_PickUpItem")
         self.agent = agent
 
     def update(self):
         try:
-            current_time = Blackboard.get("current_time")
+            Blackboard.get("current_time")
         except KeyError:
             return Status.FAILURE
+        return super().update()
+
+    async def fetch(self):
         # Simulate picking up the item.
-        time.sleep(2)
+        await get_clock().asleep(PICKUP_SECONDS)
+
+    def apply(self, result):
         print(f"{self.agent.name}: Picks up item at {self.agent.current_location}")
         # Update agent state to start delivery task
         self.agent.set_deliver_task()
         return Status.SUCCESS
 
 # Action: Drop off item at E (executes when agent reaches the delivery hub with an item)
-class DropOffItem(py_trees.behaviour.Behaviour):
+class DropOffItem(AsyncBehaviour):
     def __init__(self, agent):
         super().__init__(name=f"{agent.name}_DropOffItem")
         self.agent = agent
 
-    def update(self):
-        time.sleep(2)
+    async def fetch(self):
+        await get_clock().asleep(DROPOFF_SECONDS)
+
+    def apply(self, result):
         print(f"{self.agent.name}: Drops off item at {self.agent.current_location}")
         # Update agent state to having no item; task is complete
         self.agent.has_item = False
         # (In a more complex scenario, we might assign a new pickup task here if available)
         return Status.SUCCESS
 
-# Action: Explore to find a new path when blocked
+# Action: Explore around a blocked road: report it to the route store and
+# let QueryRAG replan from where the agent stands
 class ExploreAction(py_trees.behaviour.Behaviour):
     def __init__(self, agent):
         super().__init__(name=f"{agent.name}_Explore")
         self.agent = agent
-        self.explored = False
 
     def update(self):
-        if self.explored:
+        if self.agent.blocked_edge is None:
             return Status.SUCCESS
 
         ct = Blackboard.get("current_time")
         print(f"{self.agent.name}: !!! Entering ExploreAction at time {ct}")
 
-        # Agent3 outbound E→C
-        if (self.agent.name=="Agent3"
-            and self.agent.task_start=="E"
-            and self.agent.task_end=="C"):
-            rag_db[("E","C")] = new_path_E_C[:]
-            rag_db[("C","E")] = new_path_C_E[:]
-            print(f"{self.agent.name}: Explores and discovers new path {rag_db[('E','C')]} for E -> C")
-
-        # Agent1 **inbound** E→A
-        elif (self.agent.name=="Agent1"
-              and self.agent.task_start=="E"
-              and self.agent.task_end=="A"):
-            # assign the new E→A path
-            rag_db[("E","A")] = new_path_E_A[:]   # bypassing Y inbound
-            rag_db[("A","E")] = new_path_A_E[:]
-            print(f"{self.agent.name}: Explores and discovers new path {rag_db[('E','A')]} for E -> A")
-
-        # Agent1 **return** A→E
-        elif (self.agent.name=="Agent1"
-              and self.agent.task_start=="A"
-              and self.agent.task_end=="E"):
-            rag_db[("A","E")] = new_path_A_E[:]
-            rag_db[("E","A")] = new_path_E_A[:]
-            print(f"{self.agent.name}: Explores and discovers new path {rag_db[('A','E')]} for A -> E")
-
+        start, blocked = self.agent.blocked_edge
+        shared = [event for event in self.agent.blocked_by if is_shared(event)]
+        route_store.unwatch(self.agent.name)
+        if shared:
+            # True for everyone: report it (only the direction found blocked)
+            # until its window ends; the runner reopens it then
+            until = max(event.end for event in shared)
+            route_store.block_edge(start, blocked, agent=self.agent.name, reason="explore",
+                                   until=None if until == math.inf else until, bidirectional=False)
+        else:
+            # Blocked for this agent only: detour privately, keep the shared map open
+            until = max(event.end for event in self.agent.blocked_by)
+            self.agent.avoid[(start, blocked)] = max(until, self.agent.avoid.get((start, blocked), until))
+        self.agent.blocked_edge = None
+        self.agent.blocked_by = []
+        path = plan_route(self.agent, self.agent.current_location, self.agent.task_end)
+        if path is None:
+            print(f"{self.agent.name}: Explores but finds no route around {blocked} "
+                  f"for {self.agent.current_location} -> {self.agent.task_end}")
         else:
-            print(f"{self.agent.name}: ExploreAction ran but no matching case.")
+            print(f"{self.agent.name}: Explores and discovers new path {path} "
+                  f"for {self.agent.current_location} -> {self.agent.task_end}")
 
-        # clear path so QueryRAG will re‑fetch
+        # clear path so QueryRAG will re-fetch (from the plan cache)
         self.agent.current_path = []
         self.agent.path_index = 0
-        self.explored = True
         return Status.SUCCESS
@@ -1,12 +1,26 @@
-import py_trees
+import argparse
+import asyncio
 import time
-from agent_state_rag import Agent
+
+import py_trees
+from agent_state_rag import Agent, route_store, scenario
+from async_tick import tick_concurrently
 from behavior_tree_nodes import HasItem,QueryRAG,FollowPath, DropOffItem, NoItem, PickUpItem, ExploreAction
 from py_trees.blackboard import Blackboard
+from sim_clock import CLOCK_MODES, create_clock, get_clock, set_clock
+
+DEFAULT_AGENTS = scenario.agents or [("Agent1", "A"), ("Agent2", "B"), ("Agent3", "C")]
+
+# Simulated pauses of the demo (seconds): before the first step, before each
+# step, between agents and after each step.
+STARTUP_DELAY = 7.0
+STEP_DELAY = 2.0
+AGENT_DELAY = 0.1
+STEP_END_DELAY = 1.0
 
-# Create agents and their behavior trees
-agents = []
-for name, pickup_location in [("Agent1", "A"), ("Agent2", "B"), ("Agent3", "C")]:
+
+def build_agent(name, pickup_location):
+    """An agent starting at E with a pickup task and its behaviour tree."""
     agent = Agent(name, start_location="E")
     agent.set_pickup_task(pickup_location)  # initialize each agent with its pickup target
     # Build the behavior tree for this agent
@@ -32,28 +46,73 @@ for name, pickup_location in [("Agent1", "A"), ("Agent2", "B"), ("Agent3", "C")]
 
     # Explore sequence (fallback if above fails due to blockage)
     explore_seq = py_trees.composites.Sequence(name=f"{name}_ExploreSeq", memory=True)
-    explore_seq.add_children([ExploreAction(agent)])  
-    # (We could include a condition here if we only want to explore under certain failure contexts, 
+    explore_seq.add_children([ExploreAction(agent)])
+    # (We could include a condition here if we only want to explore under certain failure contexts,
     #  but in this design, ExploreAction is only reached when preceding sequence fails.)
 
     # Assemble the tree
     root.add_children([deliver_seq, pickup_seq, explore_seq])
     # Attach the tree to a BehaviorTree runner for ticking
     agent.tree = py_trees.trees.BehaviourTree(root)
-    agents.append(agent)
-
-
-# Simulate 5 time steps
-time.sleep(7) 
-for t in range(1, 6):   # using 1-indexed time steps for logging clarity
-    # update your BT’s notion of current_time
-    time.sleep(2) 
-    Blackboard.set("current_time", t)
-    print(f"\nTime {t}:", flush=True)
-
-    # tick each agent and pause briefly afterward
-    for agent in agents:
-        agent.tree.tick()
-        time.sleep(0.1)          # half‑second pause between agents
-    # optional extra pause before the next time step
-    time.sleep(1.0)  
\ No newline at end of file
+    return agent
+
+
+def build_agents(specs=DEFAULT_AGENTS):
+    return [build_agent(name, pickup_location) for name, pickup_location in specs]
+
+
+def run(agents, steps=5):
+    """Tick every agent once per time step; all pauses go through the simulation clock."""
+    clock = get_clock()
+    clock.sleep(STARTUP_DELAY)
+    for t in range(1, steps + 1):   # using 1-indexed time steps for logging clarity
+        # update your BT’s notion of current_time
+        clock.sleep(STEP_DELAY)
+        Blackboard.set("current_time", t)
+        print(f"\nTime {t}:", flush=True)
+        route_store.expire(t)   # reported blockages whose window ended
+
+        # tick each agent and pause briefly afterward
+        for agent in agents:
+            agent.tree.tick()
+            clock.sleep(AGENT_DELAY)
+        # optional extra pause before the next time step
+        clock.sleep(STEP_END_DELAY)
+
+
+async def arun(agents, steps=5, deadline=None):
+    """
+    Like `run`, but all agents are ticked concurrently in each step: their
+    moves and lookups overlap, effects are applied in agent order, and a
+    step waits at most `deadline` seconds for agents still busy.
+    """
+    clock = get_clock()
+    await clock.asleep(STARTUP_DELAY)
+    for t in range(1, steps + 1):
+        await clock.asleep(STEP_DELAY)
+        Blackboard.set("current_time", t)
+        print(f"\nTime {t}:", flush=True)
+        route_store.expire(t)   # reported blockages whose window ended
+
+        for agent in await tick_concurrently(agents, deadline):
+            print(f"{agent.name}: Still busy at the tick deadline, continues next step")
+        await clock.asleep(STEP_END_DELAY)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-agent delivery simulation.")
+    parser.add_argument("--clock", choices=CLOCK_MODES, help="default: BT_CLOCK or real")
+    parser.add_argument("--speed", type=float, help="speed-up of the accelerated clock")
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--concurrent", action="store_true", help="tick all agents concurrently on asyncio")
+    parser.add_argument("--deadline", type=float, help="seconds a concurrent step waits for busy agents")
+    args = parser.parse_args()
+
+    if args.clock or args.speed:
+        set_clock(create_clock(args.clock or "accelerated", args.speed))
+    started = time.perf_counter()
+    if args.concurrent:
+        asyncio.run(arun(build_agents(), args.steps, args.deadline))
+    else:
+        run(build_agents(), args.steps)
+    print(f"\nSimulated {get_clock().now():.1f}s in {time.perf_counter() - started:.2f}s wall time.")
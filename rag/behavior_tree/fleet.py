@@ -0,0 +1,151 @@
+import numpy as np
+from road_graph import PathPlanner
+
+
+# Fleet mode: the delivery behaviour of the py_trees agents, for thousands of
+# agents at once. State lives in arrays indexed by agent, and each tick
+# advances all agents with array operations; only route planning calls back
+# into Python, once per distinct (location, goal) pair and through the plan
+# cache. Durations are not simulated: one tick is one time step.
+
+class Fleet:
+    """
+    Agents that shuttle items from pickup nodes to `hub`, deciding each tick
+    as the behaviour tree does:
+
+    - without a path: QueryRAG plans from the current location to the task
+      end (an agent without a route waits and retries next tick);
+    - FollowPath moves one node, or fails on a blocked road, in which case
+      ExploreAction reports the road on the shared map and drops the path;
+    - at the task end PickUpItem switches to delivering to the hub, and
+      DropOffItem assigns the next pickup from `pickups` (the tree demo
+      leaves agents idle at the hub instead).
+
+    `world_blocked` holds roads that are closed but not yet on the map;
+    agents find them when they try to use them.
+    """
+
+    def __init__(self, graph, num_agents, pickups, hub="E", planner=None, world_blocked=(), seed=0):
+        self.graph = graph
+        self.planner = planner or PathPlanner(graph)
+        self.nodes = list(graph.nodes())
+        self.node_ids = {node: i for i, node in enumerate(self.nodes)}
+        self.num_nodes = len(self.nodes)
+        self.hub = self.node_ids[hub]
+        self.pickups = np.array([self.node_ids[p] for p in pickups], dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+
+        n = num_agents
+        self.location = np.full(n, self.hub, dtype=np.int64)
+        self.has_item = np.zeros(n, dtype=bool)
+        self.task_end = self.rng.choice(self.pickups, size=n)
+        self.paths = np.full((n, 8), -1, dtype=np.int64)
+        self.path_len = np.zeros(n, dtype=np.int64)  # 0: no current path
+        self.path_index = np.zeros(n, dtype=np.int64)
+        self.stats = dict(ticks=0, moves=0, pickups=0, dropoffs=0, plans=0, blocked=0, no_route=0)
+
+        self.world_blocked = set(world_blocked)
+        self._blocked_version = None
+        self._blocked_keys = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.location)
+
+    def close_road(self, u, v):
+        """Close a road in the world (both directions) without putting it on the map."""
+        self.world_blocked.update([(u, v), (v, u)])
+        self._blocked_version = None
+
+    def _edge_keys(self, u, v):
+        return u * self.num_nodes + v
+
+    def _refresh_blocked(self):
+        if self._blocked_version == self.graph.version:
+            return
+        edges = self.world_blocked | self.graph.blocked_edges()
+        keys = [self._edge_keys(self.node_ids[u], self.node_ids[v]) for u, v in edges]
+        self._blocked_keys = np.unique(np.array(keys, dtype=np.int64))
+        self._blocked_version = self.graph.version
+
+    def _plan(self, agents):
+        """QueryRAG for `agents`: one planner call per distinct (location, task_end)."""
+        keys = self._edge_keys(self.location[agents], self.task_end[agents])
+        unique, inverse = np.unique(keys, return_inverse=True)
+        plans = []
+        for key in unique.tolist():
+            start, goal = divmod(key, self.num_nodes)
+            path = self.planner.plan(self.nodes[start], self.nodes[goal])
+            plans.append([self.node_ids[node] for node in path] if path else [])
+        self.stats["plans"] += len(unique)
+
+        width = max(len(p) for p in plans)
+        if width > self.paths.shape[1]:
+            grown = np.full((len(self), max(width, 2 * self.paths.shape[1])), -1, dtype=np.int64)
+            grown[:, :self.paths.shape[1]] = self.paths
+            self.paths = grown
+        table = np.full((len(plans), self.paths.shape[1]), -1, dtype=np.int64)
+        for i, path in enumerate(plans):
+            table[i, :len(path)] = path
+        lengths = np.array([len(p) for p in plans], dtype=np.int64)
+
+        self.paths[agents] = table[inverse]
+        self.path_len[agents] = lengths[inverse]
+        self.path_index[agents] = 0
+        self.stats["no_route"] += int((lengths[inverse] == 0).sum())
+
+    def _arrive(self, agents):
+        """PickUpItem / DropOffItem for agents at their task end."""
+        carrying = agents[self.has_item[agents]]
+        empty = agents[~self.has_item[agents]]
+        self.stats["pickups"] += len(empty)
+        self.stats["dropoffs"] += len(carrying)
+
+        self.has_item[empty] = True
+        self.task_end[empty] = self.hub
+        self.has_item[carrying] = False
+        self.task_end[carrying] = self.rng.choice(self.pickups, size=len(carrying))
+        self.path_len[agents] = 0
+        self.path_index[agents] = 0
+
+    def tick(self):
+        self.stats["ticks"] += 1
+        need_plan = np.flatnonzero(self.path_len == 0)
+        if len(need_plan):
+            self._plan(need_plan)
+
+        active = np.flatnonzero(self.path_len > 0)
+        at_end = self.path_index[active] >= self.path_len[active] - 1
+        arrived = [active[at_end]]
+        moving = active[~at_end]
+
+        if len(moving):
+            self._refresh_blocked()
+            current = self.location[moving]
+            nxt = self.paths[moving, self.path_index[moving] + 1]
+            keys = self._edge_keys(current, nxt)
+            pos = np.minimum(np.searchsorted(self._blocked_keys, keys), max(len(self._blocked_keys) - 1, 0))
+            blocked = (self._blocked_keys[pos] == keys) if len(self._blocked_keys) else np.zeros(len(keys), bool)
+
+            stuck = moving[blocked]
+            if len(stuck):
+                # ExploreAction: report each distinct road once, drop the paths
+                for key in np.unique(keys[blocked]).tolist():
+                    u, v = divmod(key, self.num_nodes)
+                    self.graph.block_edge(self.nodes[u], self.nodes[v])
+                self.path_len[stuck] = 0
+                self.stats["blocked"] += len(stuck)
+
+            go = moving[~blocked]
+            self.location[go] = nxt[~blocked]
+            self.path_index[go] += 1
+            self.stats["moves"] += len(go)
+            arrived.append(go[self.location[go] == self.task_end[go]])
+
+        arrived = np.concatenate(arrived)
+        if len(arrived):
+            self._arrive(arrived)
+
+    def run(self, steps):
+        for _ in range(steps):
+            self.tick()
+        return self.stats
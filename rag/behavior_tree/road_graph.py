@@ -0,0 +1,272 @@
+import heapq
+import itertools
+import math
+from collections import OrderedDict
+
+INF = math.inf
+
+
+class RoadGraph:
+    """
+    Directed road graph with edge costs. `add_edge` adds both directions by
+    default. Blocking or re-costing an edge bumps `version` and appends to
+    `changes`, which planners read to repair their searches incrementally.
+    Optional node `positions` give A*/D* Lite a Euclidean heuristic; edge
+    costs must then be at least the distance between their ends.
+    """
+
+    def __init__(self):
+        self._succ = {}
+        self._pred = {}
+        self._blocked = set()
+        self.positions = {}
+        self.version = 0
+        # (version, u, v) per changed edge, oldest first
+        self.changes = []
+
+    def add_node(self, node, position=None):
+        self._succ.setdefault(node, {})
+        self._pred.setdefault(node, {})
+        if position is not None:
+            self.positions[node] = position
+
+    def add_edge(self, u, v, cost=1.0, bidirectional=True):
+        self.add_node(u)
+        self.add_node(v)
+        self._set_cost(u, v, cost)
+        if bidirectional:
+            self._set_cost(v, u, cost)
+
+    def _set_cost(self, u, v, cost):
+        changed = self._succ[u].get(v) != cost
+        self._succ[u][v] = cost
+        self._pred[v][u] = cost
+        if changed:
+            self._changed(u, v)
+
+    def _changed(self, u, v):
+        self.version += 1
+        self.changes.append((self.version, u, v))
+
+    def block_edge(self, u, v, bidirectional=True):
+        for a, b in [(u, v), (v, u)] if bidirectional else [(u, v)]:
+            if b in self._succ.get(a, {}) and (a, b) not in self._blocked:
+                self._blocked.add((a, b))
+                self._changed(a, b)
+
+    def unblock_edge(self, u, v, bidirectional=True):
+        for a, b in [(u, v), (v, u)] if bidirectional else [(u, v)]:
+            if (a, b) in self._blocked:
+                self._blocked.discard((a, b))
+                self._changed(a, b)
+
+    def is_blocked(self, u, v):
+        return (u, v) in self._blocked
+
+    def blocked_edges(self):
+        return frozenset(self._blocked)
+
+    def nodes(self):
+        return self._succ.keys()
+
+    def cost(self, u, v):
+        if (u, v) in self._blocked:
+            return INF
+        return self._succ.get(u, {}).get(v, INF)
+
+    def base_cost(self, u, v):
+        """Cost of road u -> v ignoring blockages, None if there is no such road."""
+        return self._succ.get(u, {}).get(v)
+
+    def successors(self, u):
+        return self._succ.get(u, {}).keys()
+
+    def predecessors(self, v):
+        return self._pred.get(v, {}).keys()
+
+    def changes_since(self, version):
+        """Edges changed after `version`."""
+        # Every change bumps the version by one, so entry i holds version i + 1.
+        return [(u, v) for _, u, v in self.changes[version:]]
+
+    def heuristic(self, a, b):
+        pa, pb = self.positions.get(a), self.positions.get(b)
+        if pa is None or pb is None:
+            return 0.0
+        return math.dist(pa, pb)
+
+    def __contains__(self, node):
+        return node in self._succ
+
+    def __len__(self):
+        return len(self._succ)
+
+
+class AvoidingGraph:
+    """`graph` with the roads in `avoid` treated as blocked, for detours only one agent should take."""
+
+    def __init__(self, graph, avoid):
+        self.graph = graph
+        self.avoid = avoid
+
+    def cost(self, u, v):
+        return INF if (u, v) in self.avoid else self.graph.cost(u, v)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+    def __contains__(self, node):
+        return node in self.graph
+
+
+def astar(graph, start, goal):
+    """Cheapest path from `start` to `goal` as a node list, or None if unreachable."""
+    if start not in graph or goal not in graph:
+        return None
+    counter = itertools.count()
+    frontier = [(graph.heuristic(start, goal), next(counter), start)]
+    best = {start: 0.0}
+    parent = {start: None}
+    while frontier:
+        _, _, node = heapq.heappop(frontier)
+        if node == goal:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parent[node]
+            return path[::-1]
+        for nxt in graph.successors(node):
+            cost = best[node] + graph.cost(node, nxt)
+            if cost < best.get(nxt, INF):
+                best[nxt] = cost
+                parent[nxt] = node
+                heapq.heappush(frontier, (cost + graph.heuristic(nxt, goal), next(counter), nxt))
+    return None
+
+
+class DStarLite:
+    """
+    D* Lite (Koenig & Likhachev) towards one `goal`. The search runs
+    backwards from the goal, so after an edge change only the affected part
+    of the cost-to-goal field is repaired, and moving the start costs
+    nothing beyond the `km` key offset.
+    """
+
+    def __init__(self, graph, goal):
+        self.graph = graph
+        self.goal = goal
+        self.g = {}
+        self.rhs = {goal: 0.0}
+        self.km = 0.0
+        self.last_start = None
+        self.version = graph.version
+        self._open = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._push(goal, (graph.heuristic(goal, goal), 0.0))
+
+    def _key(self, s, start):
+        best = min(self.g.get(s, INF), self.rhs.get(s, INF))
+        return (best + self.graph.heuristic(start, s) + self.km, best)
+
+    def _push(self, s, key):
+        self._open[s] = key
+        heapq.heappush(self._heap, (key, next(self._counter), s))
+
+    def _top(self):
+        while self._heap:
+            key, _, s = self._heap[0]
+            if self._open.get(s) == key:
+                return key, s
+            heapq.heappop(self._heap)
+        return (INF, INF), None
+
+    def _update_vertex(self, u, start):
+        if u != self.goal:
+            self.rhs[u] = min((self.graph.cost(u, s) + self.g.get(s, INF) for s in self.graph.successors(u)),
+                              default=INF)
+        self._open.pop(u, None)
+        if self.g.get(u, INF) != self.rhs.get(u, INF):
+            self._push(u, self._key(u, start))
+
+    def _compute(self, start):
+        while True:
+            top_key, u = self._top()
+            start_key = self._key(start, start)
+            if not (top_key < start_key or self.rhs.get(start, INF) != self.g.get(start, INF)):
+                break
+            if u is None:
+                break
+            new_key = self._key(u, start)
+            if top_key < new_key:
+                self._push(u, new_key)
+                continue
+            heapq.heappop(self._heap)
+            del self._open[u]
+            if self.g.get(u, INF) > self.rhs.get(u, INF):
+                self.g[u] = self.rhs[u]
+                for p in self.graph.predecessors(u):
+                    self._update_vertex(p, start)
+            else:
+                self.g[u] = INF
+                for p in list(self.graph.predecessors(u)) + [u]:
+                    self._update_vertex(p, start)
+
+    def plan(self, start):
+        """Cheapest path from `start` to the goal, repairing for graph changes since the last call."""
+        if start not in self.graph or self.goal not in self.graph:
+            return None
+        if self.last_start is not None and self.last_start != start:
+            self.km += self.graph.heuristic(self.last_start, start)
+        self.last_start = start
+        if self.graph.version != self.version:
+            for u, _ in self.graph.changes_since(self.version):
+                self._update_vertex(u, start)
+            self.version = self.graph.version
+        self._compute(start)
+        if self.g.get(start, INF) == INF:
+            return None
+
+        path = [start]
+        node = start
+        while node != self.goal:
+            node = min(self.graph.successors(node), key=lambda s: self.graph.cost(node, s) + self.g.get(s, INF))
+            if node in path:  # only on inconsistent costs; never loop
+                return None
+            path.append(node)
+        return path
+
+
+class PathPlanner:
+    """
+    Plans on a `RoadGraph`, cached by (start, goal, graph version). Each goal
+    keeps a D* Lite search (at most `max_goals`, least recently used
+    dropped) that is repaired incrementally when edges change.
+    """
+
+    def __init__(self, graph, cache_size=4096, max_goals=256):
+        self.graph = graph
+        self.cache_size = cache_size
+        self.max_goals = max_goals
+        self._plans = OrderedDict()
+        self._searches = OrderedDict()
+
+    def plan(self, start, goal):
+        key = (start, goal, self.graph.version)
+        if key in self._plans:
+            self._plans.move_to_end(key)
+            path = self._plans[key]
+            return path[:] if path is not None else None
+
+        search = self._searches.get(goal)
+        if search is None:
+            search = self._searches[goal] = DStarLite(self.graph, goal)
+            while len(self._searches) > self.max_goals:
+                self._searches.popitem(last=False)
+        self._searches.move_to_end(goal)
+        path = search.plan(start)
+
+        self._plans[key] = path
+        while len(self._plans) > self.cache_size:
+            self._plans.popitem(last=False)
+        return path[:] if path is not None else None
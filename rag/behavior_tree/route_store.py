@@ -0,0 +1,208 @@
+import heapq
+import os
+from collections import defaultdict, namedtuple
+
+# One entry of the append-only change log. `version` numbers all changes of
+# the store, `edge_version` the changes of that road (u -> v). `until` is the
+# time step a blockage expires at (None: until reopened). Each run restarts
+# the step count, so the persisted log stores `until` as the steps the
+# blockage had left when recorded, and replay counts them from step 0.
+RouteChange = namedtuple("RouteChange", "version u v edge_version blocked cost agent reason at until")
+
+
+class RouteStore:
+    """
+    Versioned record of what the agents learned about the road map. Every
+    blockage, reopening or re-costing of a road goes through the store,
+    which applies it to the `RoadGraph`, appends it to the change log
+    (persisted when `url` is set, and replayed into the graph on start) and
+    notifies subscribers. Blockages reported with `until` are reopened by
+    `expire` once that time step is reached.
+
+    Agents `watch` the roads of their current path, so a change only
+    reaches the agents whose paths use a changed road: the work per change
+    grows with the agents it affects, not with the fleet.
+    """
+
+    def __init__(self, graph, url=None):
+        self.graph = graph
+        self.version = 0
+        self.edge_versions = defaultdict(int)
+        self.log = []
+        self._subscribers = []
+        self._watchers = defaultdict(set)   # (u, v) -> owners
+        self._watched = {}                  # owner -> (edges, callback)
+        self._until = {}                    # blocked (u, v) -> expiry step
+        self._expiries = []                 # heap of (until, u, v), stale entries skipped
+        self.step = 0                       # latest time step passed to `expire`
+        self._engine = self._table = None
+        if url:
+            self._open(url)
+
+    @classmethod
+    def from_env(cls, graph):
+        """BT_ROUTE_STORE_URL (a SQLAlchemy URL, e.g. sqlite:///routes.db) persists the log; unset keeps it in memory."""
+        return cls(graph, os.getenv("BT_ROUTE_STORE_URL") or None)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _open(self, url):
+        from sqlalchemy import Boolean, Column, Float, Integer, MetaData, String, Table, create_engine, select
+
+        metadata = MetaData()
+        self._table = Table(
+            "route_changes", metadata,
+            Column("version", Integer, primary_key=True, autoincrement=False),
+            Column("u", String, nullable=False),
+            Column("v", String, nullable=False),
+            Column("edge_version", Integer, nullable=False),
+            Column("blocked", Boolean, nullable=False),
+            Column("cost", Float, nullable=False),
+            Column("agent", String),
+            Column("reason", String),
+            Column("at", Float),
+            Column("until", Float),
+        )
+        self._engine = create_engine(url)
+        metadata.create_all(self._engine)
+        with self._engine.connect() as conn:
+            rows = conn.execute(select(self._table).order_by(self._table.c.version)).all()
+        for row in rows:
+            change = RouteChange(*row)
+            self._apply(change)
+            self._record(change)
+
+    def _persist(self, changes):
+        if self._engine is None or not changes:
+            return
+        with self._engine.begin() as conn:
+            conn.execute(self._table.insert(), [
+                dict(change._asdict(), until=None if change.until is None else change.until - self.step)
+                for change in changes])
+
+    # ------------------------------------------------------------------
+    # Changes
+    # ------------------------------------------------------------------
+
+    def _apply(self, change):
+        if change.cost != self.graph.base_cost(change.u, change.v):
+            self.graph.add_edge(change.u, change.v, change.cost, bidirectional=False)
+        if change.blocked:
+            self.graph.block_edge(change.u, change.v, bidirectional=False)
+        else:
+            self.graph.unblock_edge(change.u, change.v, bidirectional=False)
+
+    def _record(self, change):
+        edge = (change.u, change.v)
+        if change.blocked and change.until is not None:
+            self._until[edge] = change.until
+            heapq.heappush(self._expiries, (change.until, change.u, change.v))
+        else:
+            self._until.pop(edge, None)
+        self.version = change.version
+        self.edge_versions[(change.u, change.v)] = change.edge_version
+        self.log.append(change)
+
+    def _change(self, edges, blocked=None, cost=None, agent=None, reason=None, at=None, until=None):
+        """Apply new state to directed `edges`; unchanged ones are skipped."""
+        if at is None:
+            from sim_clock import get_clock
+
+            at = get_clock().now()
+        changes = []
+        for u, v in edges:
+            old_cost = self.graph.base_cost(u, v)
+            if old_cost is None and cost is None:
+                continue
+            was_blocked = self.graph.is_blocked(u, v)
+            old_until = self._until.get((u, v))
+            new_blocked = was_blocked if blocked is None else blocked
+            new_cost = old_cost if cost is None else cost
+            if not new_blocked:
+                new_until = None
+            elif blocked is None:
+                new_until = old_until
+            elif was_blocked and (old_until is None or until is None):
+                # A blockage without expiry stays without one
+                new_until = None
+            else:
+                new_until = until if not was_blocked else max(until, old_until)
+            if (new_blocked, new_cost) == (was_blocked, old_cost) and (not new_blocked or new_until == old_until):
+                continue
+            change = RouteChange(self.version + 1, u, v, self.edge_versions[(u, v)] + 1,
+                                 new_blocked, new_cost, agent, reason, at, new_until)
+            self._apply(change)
+            self._record(change)
+            changes.append(change)
+        self._persist(changes)
+        self._notify(changes)
+        return changes
+
+    @staticmethod
+    def _both(u, v, bidirectional):
+        return [(u, v), (v, u)] if bidirectional else [(u, v)]
+
+    def block_edge(self, u, v, agent=None, reason="blocked", at=None, until=None, bidirectional=True):
+        """Block u - v; with `until`, `expire` reopens it at that time step (a later report extends it)."""
+        return self._change(self._both(u, v, bidirectional), blocked=True, agent=agent, reason=reason,
+                            at=at, until=until)
+
+    def unblock_edge(self, u, v, agent=None, reason="reopened", at=None, bidirectional=True):
+        return self._change(self._both(u, v, bidirectional), blocked=False, agent=agent, reason=reason, at=at)
+
+    def set_cost(self, u, v, cost, agent=None, reason="cost", at=None, bidirectional=True):
+        return self._change(self._both(u, v, bidirectional), cost=cost, agent=agent, reason=reason, at=at)
+
+    def expire(self, now):
+        """Reopen the blockages whose `until` is at or before time step `now`."""
+        self.step = max(self.step, now)
+        reopened = []
+        while self._expiries and self._expiries[0][0] <= now:
+            until, u, v = heapq.heappop(self._expiries)
+            if self._until.get((u, v)) == until:
+                reopened += self.unblock_edge(u, v, reason="expired", bidirectional=False)
+        return reopened
+
+    def changes_since(self, version):
+        # Versions are consecutive from the first one in the log.
+        first = self.log[0].version if self.log else 1
+        return self.log[max(version - first + 1, 0):]
+
+    # ------------------------------------------------------------------
+    # Notifications
+    # ------------------------------------------------------------------
+
+    def subscribe(self, callback):
+        """`callback(changes)` after every batch of changes."""
+        self._subscribers.append(callback)
+
+    def watch(self, owner, path, callback):
+        """`callback(changes)` when a road of `path` changes; replaces `owner`'s previous watch."""
+        self.unwatch(owner)
+        edges = set(zip(path, path[1:]))
+        for edge in edges:
+            self._watchers[edge].add(owner)
+        self._watched[owner] = (edges, callback)
+
+    def unwatch(self, owner):
+        edges, _ = self._watched.pop(owner, (set(), None))
+        for edge in edges:
+            self._watchers[edge].discard(owner)
+            if not self._watchers[edge]:
+                del self._watchers[edge]
+
+    def _notify(self, changes):
+        if not changes:
+            return
+        affected = defaultdict(list)
+        for change in changes:
+            for owner in self._watchers.get((change.u, change.v), ()):
+                affected[owner].append(change)
+        # Owners in a fixed order, so side effects do not depend on set order.
+        for owner in sorted(affected, key=str):
+            if owner in self._watched:
+                self._watched[owner][1](affected[owner])
+        for callback in self._subscribers:
+            callback(changes)
@@ -0,0 +1,215 @@
+import argparse
+import json
+import math
+import random
+from collections import defaultdict, namedtuple
+
+# A scenario file (JSON) describes the world a simulation runs in:
+#
+#   {
+#     "edges":  [["E", "X", 1.0], ...],        optional, default: the demo map
+#     "positions": {"E": [0, 0], ...},          optional, enables the A* heuristic
+#     "agents": [["Agent1", "A"], ...],         optional, (name, pickup location)
+#     "events": [
+#       {"node": "V", "from": 2, "until": 3, "agents": ["Agent3"]},
+#       {"edge": ["X", "Y"], "from": 5, "delay": 3.0, "has_item": false}
+#     ]
+#   }
+#
+# An event covers the time steps from <= t < until (until defaults to
+# forever) on a road (both directions unless "directed") or on every road
+# into a node. Without "delay" it blocks the road; with it, moves take that
+# many extra seconds. "agents" and "has_item" restrict it to matching agents.
+
+Event = namedtuple("Event", "start end edge node agents has_item delay")
+
+
+def is_shared(event):
+    """Whether the event holds for every agent, so one agent's report is true for all."""
+    return event.agents is None and event.has_item is None
+
+
+def applies_to(event, agent):
+    if event.agents is not None and agent.name not in event.agents:
+        return False
+    return event.has_item is None or event.has_item == agent.has_item
+
+
+class IntervalIndex:
+    """
+    Values active over half-open time intervals [start, end), per key, in a
+    centered interval tree: built in O(m log m) with O(m) storage for m
+    intervals, and a lookup returns the k active values in O(log m + k).
+    """
+
+    def __init__(self, items=()):
+        by_key = defaultdict(list)
+        for key, start, end, value in items:
+            if start < end:
+                by_key[key].append((start, end, value))
+        self._index = {key: self._build(intervals) for key, intervals in by_key.items()}
+
+    @classmethod
+    def _build(cls, intervals):
+        """Node (center, by_start, by_end, left, right) over `intervals`, or None."""
+        if not intervals:
+            return None
+        starts = sorted(start for start, _, _ in intervals)
+        # The median start lies in its own interval, so the node is never empty
+        # and each side gets at most half of the intervals.
+        center = starts[len(starts) // 2]
+        left, here, right = [], [], []
+        for interval in intervals:
+            start, end, _ = interval
+            if end <= center:
+                left.append(interval)
+            elif start > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        by_start = sorted(here, key=lambda interval: interval[0])
+        by_end = sorted(here, key=lambda interval: interval[1], reverse=True)
+        return center, by_start, by_end, cls._build(left), cls._build(right)
+
+    def at(self, key, t):
+        found = []
+        node = self._index.get(key)
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if t < center:
+                # Every interval here ends after the center, so it holds t if it started
+                for start, _, value in by_start:
+                    if start > t:
+                        break
+                    found.append(value)
+                node = left
+            else:
+                # Every interval here started by the center, so it holds t if it has not ended
+                for _, end, value in by_end:
+                    if end <= t:
+                        break
+                    found.append(value)
+                node = right
+        return tuple(found)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class BlockageSchedule:
+    """Scenario events indexed by road (u -> v) and by node, looked up by (time, road, agent)."""
+
+    def __init__(self, events=()):
+        self.events = list(events)
+        items = []
+        for event in self.events:
+            if event.node is not None:
+                items.append((("node", event.node), event.start, event.end, event))
+            if event.edge is not None:
+                items.append((("edge",) + tuple(event.edge), event.start, event.end, event))
+        self.index = IntervalIndex(items)
+
+    def active(self, t, u, v, agent=None):
+        events = self.index.at(("edge", u, v), t) + self.index.at(("node", v), t)
+        return [event for event in events if agent is None or applies_to(event, agent)]
+
+    def blocking(self, t, u, v, agent=None):
+        return [event for event in self.active(t, u, v, agent) if event.delay is None]
+
+    def blocked(self, t, u, v, agent=None):
+        return bool(self.blocking(t, u, v, agent))
+
+    def delay(self, t, u, v, agent=None):
+        return sum(event.delay for event in self.active(t, u, v, agent) if event.delay is not None)
+
+
+class Scenario:
+    def __init__(self, edges=None, positions=None, agents=None, events=()):
+        self.edges = edges
+        self.positions = positions or {}
+        self.agents = agents
+        self.schedule = BlockageSchedule(events)
+
+
+def parse_events(raw_events):
+    events = []
+    for raw in raw_events:
+        if ("edge" in raw) == ("node" in raw):
+            raise ValueError(f"Scenario event needs exactly one of 'edge' or 'node': {raw}")
+        common = dict(start=raw.get("from", 0), end=raw.get("until", math.inf), node=raw.get("node"),
+                      agents=frozenset(raw["agents"]) if "agents" in raw else None,
+                      has_item=raw.get("has_item"), delay=raw.get("delay"))
+        if "node" in raw:
+            events.append(Event(edge=None, **common))
+            continue
+        u, v = raw["edge"]
+        events.append(Event(edge=(u, v), **common))
+        if not raw.get("directed", False):
+            events.append(Event(edge=(v, u), **common))
+    return events
+
+
+def load_scenario(path):
+    with open(path) as f:
+        raw = json.load(f)
+    return Scenario(
+        edges=[tuple(edge) for edge in raw["edges"]] if "edges" in raw else None,
+        positions={node: tuple(pos) for node, pos in raw.get("positions", {}).items()},
+        agents=[tuple(agent) for agent in raw["agents"]] if "agents" in raw else None,
+        events=parse_events(raw.get("events", [])),
+    )
+
+
+def generate_scenario(nodes=2500, agents=200, events=1000, steps=100, max_duration=10, seed=0):
+    """
+    A randomized stress-test scenario: a jittered grid of about `nodes`
+    nodes with hub E in the middle and random diagonal shortcuts, agents
+    with random pickups, and `events` random blockages and slowdowns.
+    """
+    rng = random.Random(seed)
+    side = max(2, math.isqrt(nodes))
+    center = (side // 2, side // 2)
+    name = {(x, y): "E" if (x, y) == center else f"n{x}_{y}" for x in range(side) for y in range(side)}
+    positions = {name[(x, y)]: [x, y] for x, y in name}
+
+    edges = []
+    for (x, y), u in name.items():
+        for dx, dy in [(1, 0), (0, 1)] + ([(1, 1)] if rng.random() < 0.2 else []):
+            if (x + dx, y + dy) in name:
+                # at least the straight-line distance, so the heuristic stays admissible
+                edges.append([u, name[(x + dx, y + dy)], round(math.hypot(dx, dy) * (1 + rng.random() / 2), 3)])
+
+    others = [node for node in positions if node != "E"]
+    agent_specs = [[f"Agent{i + 1}", rng.choice(others)] for i in range(agents)]
+    raw_events = []
+    for _ in range(events):
+        start = rng.randint(1, steps)
+        event = {"from": start, "until": start + rng.randint(1, max_duration)}
+        if rng.random() < 0.7:
+            event["edge"] = rng.choice(edges)[:2]
+        else:
+            event["node"] = rng.choice(others)
+        if rng.random() < 0.3:
+            event["delay"] = float(rng.randint(1, 5))
+        if rng.random() < 0.2:
+            event["agents"] = [spec[0] for spec in rng.sample(agent_specs, min(len(agent_specs), rng.randint(1, 3)))]
+        raw_events.append(event)
+    return {"edges": edges, "positions": positions, "agents": agent_specs, "events": raw_events}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a randomized scenario for stress tests.")
+    parser.add_argument("output")
+    parser.add_argument("--nodes", type=int, default=2500)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--max-duration", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scenario = generate_scenario(args.nodes, args.agents, args.events, args.steps, args.max_duration, args.seed)
+    with open(args.output, "w") as f:
+        json.dump(scenario, f)
+    print(f"Wrote {len(scenario['positions'])} nodes, {len(scenario['edges'])} roads, "
+          f"{len(scenario['agents'])} agents and {len(scenario['events'])} events to {args.output}")
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import time
+
+
+# Clocks for the delivery simulation. Behaviours take time with
+# `get_clock().sleep(seconds)` instead of `time.sleep`, so the same tree runs
+# in real time for demos or on virtual time for tests and capacity planning.
+# Coroutine behaviours await `asleep(seconds)` instead.
+
+class RealClock:
+    """Wall-clock time; with `speed` > 1 every duration passes that many times faster."""
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self._start = time.monotonic()
+
+    def now(self):
+        """Simulated seconds since the clock was created."""
+        return (time.monotonic() - self._start) * self.speed
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    async def asleep(self, seconds):
+        if seconds > 0:
+            await asyncio.sleep(seconds / self.speed)
+
+
+class VirtualClock:
+    """Discrete-event time: `sleep` advances `now()` immediately, nothing waits."""
+
+    def __init__(self, start=0.0):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self._now += seconds
+
+    async def asleep(self, seconds):
+        """Sleeps started at the same time overlap: time advances to the latest wake-up."""
+        wake = self._now + max(seconds, 0)
+        await asyncio.sleep(0)
+        self._now = max(self._now, wake)
+
+
+CLOCK_MODES = ("real", "accelerated", "virtual")
+
+
+def create_clock(mode=None, speed=None):
+    """BT_CLOCK: `real` (default), `accelerated` (BT_CLOCK_SPEED times faster, default 10) or `virtual`."""
+    mode = mode or os.getenv("BT_CLOCK", "real")
+    if mode == "real":
+        return RealClock()
+    if mode == "accelerated":
+        return RealClock(speed=float(speed or os.getenv("BT_CLOCK_SPEED", "10")))
+    if mode == "virtual":
+        return VirtualClock()
+    raise ValueError(f"Unknown clock mode: {mode}")
+
+
+_clock = create_clock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
@@ -1,7 +1,9 @@
-import openai
 from pypdf import PdfReader
+from rag.agentic_rag.embedding_service import EMBEDDING_MODEL, embed_texts
+from rag.agentic_rag.llm_limits import llm_priority
 from rag.operations.crud import add_document_chunks
 from rag.db.db import SessionLocal
+from rag.observability.tracing import span
 
 def extract_pdf_text(path):
     reader = PdfReader(path)
@@ -13,17 +15,18 @@ def chunk_text(text, chunk_size=500, overlap=50):
         yield " ".join(words[i:i + chunk_size])
 
 def embed_text(text):
-    response = openai.Embedding.create(
-        input=text,
-        model="text-embedding-3-small",
-        
-    )
-    return response['data'][0]['embedding']
+    return embed_batch([text])[0]
+
+def embed_batch(texts):
+    with span("embedding", model=EMBEDDING_MODEL, chunks=len(texts)):
+        return embed_texts(texts)
 
 def ingest_pdf(path, filename):
     text = extract_pdf_text(path)
     chunks = list(chunk_text(text))
-    embeddings = [embed_text(chunk) for chunk in chunks]
+    with llm_priority("bulk"):
+        embeddings = embed_batch(chunks)
     session = SessionLocal()
     add_document_chunks(filename, chunks, embeddings, session)
-    session.close()
\ No newline at end of file
+    session.close()
+    return len(chunks)
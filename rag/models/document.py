@@ -1,6 +1,7 @@
 from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Text
 from pgvector.sqlalchemy import VECTOR
 from sqlalchemy.sql import func
+from rag.agentic_rag.embedding_service import embedding_dim
 from . import Base
 
 class Document(Base):
@@ -9,7 +10,7 @@ class Document(Base):
     filename = Column(String, nullable=False)
     uploaded_at = Column(DateTime, server_default=func.now())
     content = Column(Text, nullable=False)  
-    embedding = Column(VECTOR(1536), nullable=False)  
+    embedding = Column(VECTOR(embedding_dim()), nullable=False)  
     doc_metadata = Column(String) 
 
     
@@ -0,0 +1,351 @@
+"""
+Request-scoped span trees with slow-request profiling.
+
+`TracingMiddleware` opens a root span per HTTP request and returns its id
+in the `X-Trace-Id` header. Code on the hot path opens child spans with
+
+    with span("llm", stage="synthesis"):
+        ...
+
+and every SQL statement is recorded through SQLAlchemy engine events.
+With `TRACE_PROFILE=1`, a request still running after
+`TRACE_PROFILE_AFTER_MS` (default: half of `TRACE_SLOW_MS`) has its
+threads sampled from then on; when it takes longer than `TRACE_SLOW_MS`
+the folded stacks are kept with the trace so `/debug/traces/{id}` can
+show where the time went.
+"""
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as StackCounter
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_HEADER = "x-trace-id"
+SLOW_REQUEST_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+PROFILE_INTERVAL_MS = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "10"))
+PROFILE_ENABLED = os.getenv("TRACE_PROFILE", "0") == "1"
+PROFILE_AFTER_MS = float(os.getenv("TRACE_PROFILE_AFTER_MS", str(SLOW_REQUEST_MS / 2)))
+MAX_STORED_TRACES = int(os.getenv("TRACE_MAX_STORED", "500"))
+MAX_STACK_DEPTH = 64
+# Incoming trace ids are used as store keys, so only well-formed ones are kept.
+TRACE_ID_RE = re.compile(r"[A-Za-z0-9_-]{16,64}")
+
+
+class Span:
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000.0
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000.0, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [c.to_dict(origin) for c in self.children],
+        }
+
+
+class Trace:
+    def __init__(self, trace_id: str, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.root = Span(name, attributes)
+        self.started_at = time.time()
+        self.thread_ids = {threading.get_ident()}
+        self.samples: StackCounter = StackCounter()
+        self.profile: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def add_child(self, parent: Span, child: Span) -> None:
+        with self._lock:
+            parent.children.append(child)
+            self.thread_ids.add(threading.get_ident())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.root.duration_ms, 3),
+            "root": self.root.to_dict(self.root.start),
+            "profile": self.profile,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def start_span(name: str, **attributes: Any):
+    """Open a child of the current span; returns `None` outside a trace."""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    if trace is None or parent is None:
+        return None
+    child = Span(name, attributes)
+    trace.add_child(parent, child)
+    return child, _current_span.set(child)
+
+
+def end_span(handle, error: Optional[BaseException] = None) -> None:
+    if handle is None:
+        return
+    child, token = handle
+    child.end = time.perf_counter()
+    if error is not None:
+        child.error = repr(error)
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Ended from a different context than it was started in.
+        pass
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    handle = start_span(name, **attributes)
+    try:
+        yield handle[0] if handle else None
+    except BaseException as exc:
+        end_span(handle, exc)
+        raise
+    else:
+        end_span(handle)
+
+
+# ----------------------------------------------------------------------------
+# Trace storage
+# ----------------------------------------------------------------------------
+
+class TraceStore:
+    """Bounded, insertion-ordered store of finished traces."""
+
+    def __init__(self, max_traces: int = MAX_STORED_TRACES):
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces[trace.trace_id] = trace.to_dict()
+            self._traces.move_to_end(trace.trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def __contains__(self, trace_id: str) -> bool:
+        with self._lock:
+            return trace_id in self._traces
+
+    def recent(self, slow_only: bool = False, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._traces.values())
+        if slow_only:
+            traces = [t for t in traces if t["profile"] is not None]
+        return [
+            {"trace_id": t["trace_id"], "name": t["root"]["name"], "duration_ms": t["duration_ms"],
+             "started_at": t["started_at"], "profiled": t["profile"] is not None}
+            for t in reversed(traces[-limit:])
+        ]
+
+
+TRACE_STORE = TraceStore()
+
+
+# ----------------------------------------------------------------------------
+# Sampling profiler
+# ----------------------------------------------------------------------------
+
+def _folded_stack(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    One daemon thread sampling the stacks of every thread that belongs to
+    an in-flight trace. It sleeps while no trace is active.
+
+    Requests served concurrently on the event loop thread share that
+    thread, so their samples overlap; spans run in worker threads are
+    attributed precisely.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self._active: Dict[str, Trace] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+            self._thread.start()
+
+    def register(self, trace: Trace) -> None:
+        with self._lock:
+            self._active[trace.trace_id] = trace
+            self._ensure_started()
+        self._wakeup.set()
+
+    def unregister(self, trace: Trace) -> None:
+        with self._lock:
+            self._active.pop(trace.trace_id, None)
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active.values())
+                if not active:
+                    self._wakeup.clear()
+                else:
+                    # Sampled under the lock so `unregister` returning means
+                    # the trace's samples are final.
+                    frames = sys._current_frames()
+                    for trace in active:
+                        with trace._lock:
+                            idents = list(trace.thread_ids)
+                        for ident in idents:
+                            frame = frames.get(ident)
+                            if frame is not None and ident != own_ident:
+                                trace.samples[_folded_stack(frame)] += 1
+                    del frames
+            if not active:
+                self._wakeup.wait()
+                continue
+            time.sleep(self.interval)
+
+
+PROFILER = SamplingProfiler()
+
+
+# ----------------------------------------------------------------------------
+# SQLAlchemy and HTTP integration
+# ----------------------------------------------------------------------------
+
+def instrument_sqlalchemy() -> None:
+    """Record a `db.query` span for every statement run by any engine."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if getattr(instrument_sqlalchemy, "_done", False):
+        return
+    instrument_sqlalchemy._done = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        handle = start_span("db.query", statement=statement[:200], executemany=executemany)
+        conn.info.setdefault("trace_spans", []).append(handle)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("trace_spans")
+        if stack:
+            end_span(stack.pop())
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("trace_spans") if conn is not None else None
+        if stack:
+            end_span(stack.pop(), exception_context.original_exception)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a trace per request.
+
+    The trace id is taken from an incoming `X-Trace-Id` header when it is
+    well-formed and not already in use, otherwise generated, and echoed on
+    the response. Requests are profiled only once they have run for
+    `profile_after_ms`, so fast ones never reach the sampler.
+    """
+
+    def __init__(self, app, app_name: str = "rag", slow_ms: float = SLOW_REQUEST_MS,
+                 profile: bool = PROFILE_ENABLED, profile_after_ms: float = PROFILE_AFTER_MS):
+        self.app = app
+        self.app_name = app_name
+        self.slow_ms = slow_ms
+        self.profile = profile
+        self.profile_after_ms = profile_after_ms
+        self._in_flight: set = set()
+        instrument_sqlalchemy()
+
+    def _trace_id(self, incoming: Optional[bytes]) -> str:
+        trace_id = incoming.decode("latin-1") if incoming else ""
+        if not TRACE_ID_RE.fullmatch(trace_id) or trace_id in self._in_flight or trace_id in TRACE_STORE:
+            trace_id = uuid.uuid4().hex
+        return trace_id
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id = self._trace_id(headers.get(TRACE_HEADER.encode()))
+        self._in_flight.add(trace_id)
+        trace = Trace(trace_id, f"{scope.get('method', '')} {scope.get('path', '')}", {"app": self.app_name})
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        profile_timer = None
+        if self.profile:
+            profile_timer = asyncio.get_running_loop().call_later(
+                self.profile_after_ms / 1000.0, PROFILER.register, trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(TRACE_HEADER.encode(), trace_id.encode())]
+                trace.root.attributes["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            trace.root.error = repr(exc)
+            raise
+        finally:
+            trace.root.end = time.perf_counter()
+            route = scope.get("route")
+            if route is not None:
+                trace.root.attributes["route"] = getattr(route, "path", None)
+            if profile_timer is not None:
+                profile_timer.cancel()
+                PROFILER.unregister(trace)
+                if trace.root.duration_ms >= self.slow_ms:
+                    trace.profile = dict(trace.samples.most_common())
+            TRACE_STORE.add(trace)
+            self._in_flight.discard(trace_id)
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)